@@ -14,8 +14,11 @@ from cucim.skimage._vendored import _ndimage_util as _util
 @cupy.memoize(for_each_device=True)
 def _get_binary_erosion_kernel(
     w_shape, int_type, offsets, center_is_true, border_value, invert, masked,
-    all_weights_nonzero
+    all_weights_nonzero, accumulate=False
 ):
+    # If accumulate is True, the existing output is combined with the result:
+    # elements of the output that are already true_val are left unchanged
+    # (i.e. a running maximum of erosions or minimum of dilations).
     if invert:
         border_value = int(not border_value)
         true_val = 0
@@ -24,8 +27,15 @@ def _get_binary_erosion_kernel(
         true_val = 1
         false_val = 0
 
-    if masked:
+    if accumulate:
         pre = """
+            if (y == cast<Y>({true_val})) {{
+                return;
+            }}""".format(true_val=true_val)
+    else:
+        pre = ''
+    if masked:
+        pre += """
             bool mv = (bool)mask[i];
             bool _in = (bool)x[i];
             if (!mv) {{
@@ -37,7 +47,7 @@ def _get_binary_erosion_kernel(
             }}""".format(center_is_true=int(center_is_true),
                          false_val=false_val)
     else:
-        pre = """
+        pre += """
             bool _in = (bool)x[i];
             if ({center_is_true} && _in == {false_val}) {{
                 y = cast<Y>(_in);
@@ -67,6 +77,8 @@ def _get_binary_erosion_kernel(
     name = 'binary_erosion'
     if false_val:
         name += '_invert'
+    if accumulate:
+        name += '_accumulate'
     has_weights = not all_weights_nonzero
 
     return _filters_core._generate_nd_kernel(
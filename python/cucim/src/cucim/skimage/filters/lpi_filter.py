@@ -3,27 +3,220 @@
 :license: modified BSD
 """
 
+import collections
+import functools
+import math
+
 import cupy as cp
 import numpy as np
 from cupyx.scipy import fft
+from cupyx.scipy.fftpack import get_fft_plan
 
 from .._shared.utils import _supported_float_type, check_nD, deprecated
+from .._vendored.pad_elementwise import _get_pad_kernel
 
 eps = np.finfo(float).eps
 
+# Least-recently-used cache of filter spectra and cuFFT plans shared by all
+# LPIFilter2D instances, so that e.g. repeated calls to filter_forward with the
+# same impulse response do not recompute the filter FFT.
+_FILTER_CACHE = collections.OrderedDict()
+_FILTER_CACHE_SIZE = 8
+
+
+def _filter_cache_key(impulse_response, analytic_ft, filter_params, shape,
+                      oshape, dtype):
+    """Return a hashable cache key or None if the parameters are unhashable.
+    """
+    key = (impulse_response, analytic_ft,
+           tuple(sorted(filter_params.items())), shape, oshape, dtype,
+           cp.cuda.Device().id)
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+
+# Raise the magnitude of `x` to at least `val`, preserving its sign (or complex
+# phase). Exact zeros are set to `val`. `mag` holds the resulting magnitude.
+_min_limit_operation = """
+    double mag = abs(x);
+    if (mag < val) {
+        x = (mag == 0) ? static_cast<T>(val) : x * static_cast<T>(val / mag);
+        mag = val;
+    }
+"""
+
+
+@cp.memoize(for_each_device=True)
+def _get_min_limit_kernel():
+    return cp.ElementwiseKernel(
+        in_params='float64 val',
+        out_params='T x',
+        operation=_min_limit_operation,
+        name='cucim_lpi_min_limit'
+    )
+
+
+@cp.memoize(for_each_device=True)
+def _get_inverse_filter_kernel():
+    # Computes G / F with |F| limited to at least `val` and the magnitude of
+    # the gain 1 / F limited to at most `max_gain`. Since 1 / F = F* / |F|^2,
+    # the gain is applied as the conjugate of F times a real-valued scale.
+    return cp.ElementwiseKernel(
+        in_params='T F, T G, float64 val, float64 max_gain',
+        out_params='T out',
+        operation="""
+        T x = F;
+        """ + _min_limit_operation + """
+        double gain = 1.0 / mag;
+        double scale = (gain > max_gain) ? max_gain / mag : gain * gain;
+        out = G * conj(x) * static_cast<T>(scale);
+        """,
+        name='cucim_lpi_inverse_filter'
+    )
+
+
+@cp.memoize(for_each_device=True)
+def _get_wiener_filter_kernel():
+    # Applies the Wiener filter F* / (|F|^2 + K), which is equivalent to
+    # 1 / F * |F|^2 / (|F|^2 + K), to G with |F| limited to at least `val`.
+    # Only the scale 1 / (|F|^2 + K) is real-valued, so it is computed in real
+    # arithmetic.
+    return cp.ElementwiseKernel(
+        in_params='T F, T G, float64 K, float64 val',
+        out_params='T out',
+        operation="""
+        T x = F;
+        """ + _min_limit_operation + """
+        double scale = 1.0 / (mag * mag + K);
+        out = G * conj(x) * static_cast<T>(scale);
+        """,
+        name='cucim_lpi_wiener_filter'
+    )
+
+
+@cp.memoize(for_each_device=True)
+def _get_phase_shift_kernel():
+    # Multiplies a transfer function by the linear phase exp(-2j*pi*f.x0)
+    # corresponding to a spatial shift of the filter by x0 = (cr, cc).
+    return cp.ElementwiseKernel(
+        in_params='X ft, F fr, F fc, float64 cr, float64 cc',
+        out_params='Y out',
+        operation=f"""
+        double phase = {-2 * math.pi!r} * (fr * cr + fc * cc);
+        out = Y(ft) * Y(cos(phase), sin(phase));
+        """,
+        name='cucim_lpi_phase_shift'
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def gaussian_ft(sigma):
+    """Analytic transfer function of a Gaussian impulse response.
+
+    Returns a function usable as the `analytic_ft` argument of LPIFilter2D
+    that is equivalent to the impulse response
+    ``exp(-(r**2 + c**2) / (2 * sigma**2))``.
+
+    Parameters
+    ----------
+    sigma : float
+        Standard deviation of the Gaussian (in pixels).
+    """
+    if sigma <= 0:
+        raise ValueError("sigma must be positive.")
+
+    def ft(freq_r, freq_c):
+        scale = 2 * math.pi ** 2 * sigma ** 2
+        return (2 * math.pi * sigma ** 2) * cp.exp(
+            -scale * (freq_r * freq_r + freq_c * freq_c)
+        )
+    return ft
+
+
+def _box_ft_1d(freq, size):
+    """Discrete-time Fourier transform of a centered box of odd `size`."""
+    denom = cp.sin(math.pi * freq)
+    zero = denom == 0
+    return cp.where(zero, size,
+                    cp.sin((math.pi * size) * freq) / cp.where(zero, 1, denom))
+
+
+@functools.lru_cache(maxsize=None)
+def box_ft(size):
+    """Analytic transfer function of a box (uniform) impulse response.
+
+    Returns a function usable as the `analytic_ft` argument of LPIFilter2D
+    that is equivalent to the impulse response equal to one where
+    ``abs(r) <= (size - 1) / 2`` and ``abs(c) <= (size - 1) / 2`` and zero
+    elsewhere.
+
+    Parameters
+    ----------
+    size : int
+        Width of the box (in pixels). Must be odd.
+    """
+    if size < 1 or size % 2 == 0:
+        raise ValueError("size must be a positive odd integer.")
+
+    def ft(freq_r, freq_c):
+        return _box_ft_1d(freq_r, size) * _box_ft_1d(freq_c, size)
+    return ft
+
 
 def _min_limit(x, val=eps):
-    mask = cp.abs(x) < eps
-    x[mask] = cp.sign(x[mask]) * eps
+    """Limit the magnitude of ``x`` to at least ``val`` (in-place)."""
+    _get_min_limit_kernel()(val, x)
 
 
 def _center(x, oshape):
-    """Return an array of shape ``oshape`` from the center of array ``x``."""
-    start = (np.array(x.shape) - np.array(oshape)) // 2 + 1
+    """Return an array of shape ``oshape`` from the center of the linear
+    convolution stored at the start of the zero-padded array ``x``."""
+    start = (np.array(oshape) - 1) // 2 + 1
     out = x[tuple(slice(s, s + n) for s, n in zip(start, oshape))]
     return out
 
 
+def _center_wrapped(x, oshape):
+    """Return an array of shape ``oshape`` centered on the origin of the
+    circularly wrapped array ``x``.
+
+    This is equivalent to cropping the center of ``ifftshift(x)`` when
+    ``x.shape == 2 * oshape - 1``, but holds for any larger padded shape.
+    """
+    idx = [cp.arange(-(n // 2), n - n // 2) % s
+           for n, s in zip(oshape, x.shape)]
+    return x[cp.ix_(*idx)]
+
+
+def _oshape(dshape):
+    """Shape of the zero-padded arrays used for FFT-based filtering.
+
+    Each axis is padded to at least ``2 * n - 1`` to avoid circular
+    wrap-around, rounded up to a size with only small prime factors for which
+    cuFFT is efficient.
+    """
+    return tuple(fft.next_fast_len(2 * n - 1, real=True) for n in dshape)
+
+
+def _half_spectrum(x, oshape):
+    """Return the part of the 2-D array ``x`` on the non-redundant half of
+    the spectrum of a real array of shape ``oshape``.
+
+    ``x`` may be given on the full or the half spectrum (or be broadcastable
+    to either). None is returned if it is not.
+    """
+    half_n = oshape[1] // 2 + 1
+    if (x.shape[0] not in (1, oshape[0])
+            or x.shape[1] not in (1, half_n, oshape[1])):
+        return None
+    if x.shape[1] == oshape[1]:
+        x = x[:, :half_n]
+    return x
+
+
 def _pad(data, shape):
     """Pad the data to the given shape with zeros.
 
@@ -33,23 +226,35 @@ def _pad(data, shape):
         Input data
     shape : (2,) tuple
 
+    Notes
+    -----
+    A single elementwise kernel writes both the data and the zero-padded
+    region, rather than zero-filling the output and then copying the data.
     """
-    out = cp.zeros(shape, dtype=data.dtype)
-    out[tuple(slice(0, n) for n in data.shape)] = data
+    if not data.flags.c_contiguous:
+        data = cp.ascontiguousarray(data)
+    out = cp.empty(shape, dtype=data.dtype)
+    int_type = 'int' if out.size < (1 << 31) else 'ptrdiff_t'
+    kern = _get_pad_kernel(pad_starts=(0,) * data.ndim, int_type=int_type,
+                           mode='constant', order='C')
+    kern(data, 0.0, out, size=out.size)
     return out
 
 
 class LPIFilter2D:
     """Linear Position-Invariant Filter (2-dimensional)"""
 
-    def __init__(self, impulse_response, **filter_params):
+    def __init__(self, impulse_response, analytic_ft=None, **filter_params):
         """
         Parameters
         ----------
-        impulse_response : callable `f(r, c, **filter_params)`
+        impulse_response : callable `f(r, c, **filter_params)` or None
             Function that yields the impulse response.  ``r`` and ``c`` are
-            1-dimensional vectors that represent row and column positions, in
-            other words coordinates are (r[0],c[0]),(r[0],c[1]) etc.
+            row and column positions given as a column vector of shape
+            ``(M, 1)`` and a row vector of shape ``(1, N)``, respectively, so
+            that they broadcast against each other to the full ``(M, N)``
+            grid of coordinates. The function should return an array of
+            shape ``(M, N)`` (or one broadcastable to it).
             `**filter_params` are passed through.
 
             In other words, ``impulse_response`` would be called like this:
@@ -57,11 +262,20 @@ class LPIFilter2D:
             >>> def impulse_response(r, c, **filter_params):
             ...     pass
             >>>
-            >>> r = [0,0,0,1,1,1,2,2,2]
-            >>> c = [0,1,2,0,1,2,0,1,2]
+            >>> r = cp.arange(3)[:, cp.newaxis]
+            >>> c = cp.arange(3)[cp.newaxis, :]
             >>> filter_params = {'kw1': 1, 'kw2': 2, 'kw3': 3}
             >>> impulse_response(r, c, **filter_params)
 
+            May be None if `analytic_ft` is given.
+        analytic_ft : callable `f(freq_r, freq_c)`, optional
+            Transfer function of the filter, i.e. the Fourier transform of
+            the impulse response centered on the origin. ``freq_r`` and
+            ``freq_c`` are frequencies in cycles per pixel given as a column
+            and a row vector, respectively. When provided, the filter
+            spectrum is evaluated directly in the frequency domain instead of
+            sampling `impulse_response` and computing its FFT. See
+            `gaussian_ft` and `box_ft`.
 
         Examples
         --------
@@ -72,46 +286,126 @@ class LPIFilter2D:
         ...     return cp.exp(-cp.hypot(r, c)/sigma)
         >>> filter = LPIFilter2D(filt_func)
 
+        Gaussian filter with an analytically computed spectrum:
+
+        >>> from cucim.skimage.filters.lpi_filter import gaussian_ft
+        >>> filter = LPIFilter2D(None, analytic_ft=gaussian_ft(2))
+
         """
-        if not callable(impulse_response):
+        if analytic_ft is not None:
+            if not callable(analytic_ft):
+                raise ValueError("analytic_ft must be a callable.")
+        elif not callable(impulse_response):
             raise ValueError("Impulse response must be a callable.")
 
         self.impulse_response = impulse_response
+        self.analytic_ft = analytic_ft
         self.filter_params = filter_params
         self._cache = None
+        self._cache_key = None
+        # cuFFT plans for the forward (R2C) and inverse (C2R) transforms
+        self._plans = None
+
+    def _prepare(self, data, oshape=None):
+        """Calculate filter and data FFT in preparation for filtering.
 
-    def _prepare(self, data):
-        """Calculate filter and data FFT in preparation for filtering."""
+        The transforms are zero-padded to `oshape` (by default
+        ``_oshape(data.shape)``).
+        """
         dshape = np.array(data.shape)
         dshape += dshape % 2 == 0  # all filter dimensions must be uneven
-        oshape = np.array(data.shape) * 2 - 1
+        if oshape is None:
+            oshape = _oshape(data.shape)
 
         float_dtype = _supported_float_type(data.dtype)
         data = data.astype(float_dtype, copy=False)
 
-        if self._cache is None or np.any(self._cache.shape != oshape):
-            coords = cp.mgrid[[slice(0, float(n)) for n in dshape]]
-            # this steps over two sets of coordinates,
-            # not over the coordinates individually
-            for k, coord in enumerate(coords):
-                coord -= (dshape[k] - 1) / 2.0
-            coords = coords.reshape(2, -1).T  # coordinate pairs (r,c)
-            coords = coords.astype(float_dtype, copy=False)
-
-            f = self.impulse_response(coords[:, 0], coords[:, 1],
-                                      **self.filter_params).reshape(dshape)
-
-            f = _pad(f, oshape)
-            F = fft.fftn(f)
+        # The filter and the data are both real-valued, so only the
+        # non-redundant half of the spectrum (along the last axis) is needed.
+        cache_key = (tuple(data.shape), oshape, float_dtype)
+        if self._cache is None or self._cache_key != cache_key:
+            global_key = _filter_cache_key(
+                self.impulse_response, self.analytic_ft, self.filter_params,
+                *cache_key
+            )
+            cached = _FILTER_CACHE.get(global_key)
+            if cached is not None:
+                _FILTER_CACHE.move_to_end(global_key)
+                F, plans = cached
+            else:
+                F, plans = self._filter_spectrum(dshape, oshape, float_dtype)
+                if global_key is not None:
+                    _FILTER_CACHE[global_key] = (F, plans)
+                    if len(_FILTER_CACHE) > _FILTER_CACHE_SIZE:
+                        _FILTER_CACHE.popitem(last=False)
             self._cache = F
+            self._cache_key = cache_key
+            self._plans = plans
         else:
             F = self._cache
 
         data = _pad(data, oshape)
-        G = fft.fftn(data)
+        G = fft.rfftn(data, plan=self._plans[0])
 
         return F, G
 
+    def _filter_spectrum(self, dshape, oshape, float_dtype):
+        """Compute the filter FFT and the cuFFT plans for the padded shape."""
+        if self.analytic_ft is not None:
+            return self._analytic_spectrum(dshape, oshape, float_dtype)
+
+        # centered row and column coordinates that broadcast to the full
+        # grid (avoids materializing a dense coordinate table)
+        r, c = (
+            cp.arange(n, dtype=float_dtype) - (n - 1) / 2.0
+            for n in dshape.tolist()
+        )
+        r = r[:, cp.newaxis]
+        c = c[cp.newaxis, :]
+
+        f = self.impulse_response(r, c, **self.filter_params)
+        # the impulse response may be of any dtype (e.g. a boolean mask), but
+        # the transforms and the cached plans use the dtype of the data
+        f = cp.broadcast_to(f, tuple(dshape)).astype(float_dtype, copy=False)
+
+        f = _pad(f, oshape)
+        fwd_plan = get_fft_plan(f, value_type='R2C')
+        F = fft.rfftn(f, plan=fwd_plan)
+        inv_plan = get_fft_plan(F, shape=oshape, value_type='C2R')
+        return F, (fwd_plan, inv_plan)
+
+    def _analytic_spectrum(self, dshape, oshape, float_dtype):
+        """Evaluate `analytic_ft` on the frequency grid of the padded shape.
+
+        The result matches the FFT of the impulse response sampled on a
+        ``dshape`` grid centered at ``(dshape - 1) / 2`` (as done in
+        `_filter_spectrum`), so that the centering of the output is
+        unchanged.
+        """
+        fr = fft.fftfreq(oshape[0]).astype(float_dtype, copy=False)
+        fc = fft.rfftfreq(oshape[1]).astype(float_dtype, copy=False)
+        fr = fr[:, cp.newaxis]
+        fc = fc[cp.newaxis, :]
+        ft = self.analytic_ft(fr, fc)
+
+        complex_dtype = cp.result_type(float_dtype, cp.complex64)
+        F = cp.empty((oshape[0], oshape[1] // 2 + 1), dtype=complex_dtype)
+        cr, cc = ((n - 1) / 2 for n in dshape.tolist())
+        _get_phase_shift_kernel()(ft, fr, fc, cr, cc, F)
+
+        # the plans only depend on the shape and dtype of the transforms
+        fwd_plan = get_fft_plan(cp.empty(oshape, dtype=float_dtype),
+                                value_type='R2C')
+        inv_plan = get_fft_plan(F, shape=oshape, value_type='C2R')
+        return F, (fwd_plan, inv_plan)
+
+    def _irfftn(self, X, oshape):
+        """Inverse real FFT, reusing the cached plan when applicable."""
+        plan = None
+        if self._cache is not None and X.dtype == self._cache.dtype:
+            plan = self._plans[1]
+        return fft.irfftn(X, s=oshape, plan=plan)
+
     def __call__(self, data):
         """Apply the filter to the given data.
 
@@ -122,7 +416,7 @@ class LPIFilter2D:
         """
         check_nD(data, 2, 'data')
         F, G = self._prepare(data)
-        out = fft.ifftn(F * G)
+        out = self._irfftn(F * G, _oshape(data.shape))
         out = cp.abs(_center(out, data.shape))
         return out
 
@@ -204,13 +498,10 @@ def filter_inverse(data, impulse_response=None, filter_params={}, max_gain=2,
         filt = predefined_filter
 
     F, G = filt._prepare(data)
-    _min_limit(F)
-
-    F = 1 / F
-    mask = cp.abs(F) > max_gain
-    F[mask] = cp.sign(F[mask]) * max_gain
+    GF = _get_inverse_filter_kernel()(F, G, eps, max_gain)
 
-    return _center(cp.abs(fft.ifftshift(fft.ifftn(G * F))), data.shape)
+    out = filt._irfftn(GF, _oshape(data.shape))
+    return cp.abs(_center_wrapped(out, data.shape))
 
 
 def wiener(data, impulse_response=None, filter_params={}, K=0.25,
@@ -221,9 +512,17 @@ def wiener(data, impulse_response=None, filter_params={}, K=0.25,
     ----------
     data : (M,N) ndarray
         Input data.
-    K : float or (M,N) ndarray
+    K : float or (P,Q) ndarray
         Ratio between power spectrum of noise and undegraded
-        image.
+        image. An array is given on the frequency grid of the zero-padded
+        FFT, i.e. with ``P, Q = [cupyx.scipy.fft.next_fast_len(2 * n - 1,
+        real=True) for n in data.shape]``, either as the full spectrum of
+        shape ``(P, Q)`` or as the non-redundant half spectrum of shape
+        ``(P, Q // 2 + 1)`` (as produced by ``rfftn``). Arrays broadcastable
+        to either are accepted as well. For compatibility, an array on the
+        grid of shape ``(2 * M - 1, 2 * N - 1)`` used by earlier versions is
+        still accepted, in which case the FFTs are padded to that (possibly
+        slower) shape instead.
     impulse_response : callable `f(r, c, **filter_params)`
         Impulse response of the filter.  See LPIFilter2D.__init__.
     filter_params : dict
@@ -246,13 +545,25 @@ def wiener(data, impulse_response=None, filter_params={}, K=0.25,
     else:
         filt = predefined_filter
 
-    F, G = filt._prepare(data)
-    _min_limit(F)
-
-    H_mag_sqr = cp.abs(F)
-    H_mag_sqr *= H_mag_sqr
-    F = 1 / F * H_mag_sqr / (H_mag_sqr + K)
-
-    tmp = fft.ifftn(G * F)
-    tmp = fft.ifftshift(tmp)
-    return _center(cp.abs(tmp), data.shape)
+    oshape = _oshape(data.shape)
+    if isinstance(K, cp.ndarray):
+        K_half = _half_spectrum(K, oshape)
+        if K_half is None:
+            # K on the unpadded grid of earlier versions
+            legacy_oshape = tuple(2 * n - 1 for n in data.shape)
+            K_half = _half_spectrum(K, legacy_oshape)
+            if K_half is None:
+                raise ValueError(
+                    f"K of shape {K.shape} does not match the padded "
+                    f"spectrum of the data: expected {oshape} (full "
+                    f"spectrum) or {(oshape[0], oshape[1] // 2 + 1)} (half "
+                    f"spectrum)"
+                )
+            oshape = legacy_oshape
+        K = K_half
+
+    F, G = filt._prepare(data, oshape)
+    GF = _get_wiener_filter_kernel()(F, G, K, eps)
+
+    tmp = filt._irfftn(GF, oshape)
+    return cp.abs(_center_wrapped(tmp, data.shape))
@@ -1,9 +1,11 @@
 import cupy as cp
 import pytest
+from cupy.testing import assert_allclose
 from skimage import data
 
 from cucim.skimage._shared.utils import _supported_float_type
 from cucim.skimage.filters import LPIFilter2D, filter_inverse, wiener
+from cucim.skimage.filters.lpi_filter import _oshape, box_ft, gaussian_ft
 
 
 class TestLPIFilter2D:
@@ -66,6 +68,95 @@ class TestLPIFilter2D:
         g1 = wiener(F[::-1, ::-1], self.filt_func)
         assert (g - g1[::-1, ::-1]).sum() < 1
 
+    @pytest.mark.parametrize('dtype', [cp.float32, cp.float64])
+    @pytest.mark.parametrize('response_dtype', [bool, cp.int32, cp.float64])
+    def test_impulse_response_dtype(self, dtype, response_dtype):
+        def box(r, c):
+            return ((cp.abs(r) <= 1) & (cp.abs(c) <= 1)).astype(response_dtype)
+
+        def box_float(r, c):
+            return ((cp.abs(r) <= 1) & (cp.abs(c) <= 1)).astype(dtype)
+
+        img = self.img.astype(dtype)
+        filt = LPIFilter2D(box)
+        expected_filt = LPIFilter2D(box_float)
+        rtol = 1e-4 if dtype == cp.float32 else 1e-7
+
+        out = filt(img)
+        expected = expected_filt(img)
+        assert out.dtype == dtype
+        assert_allclose(out, expected, rtol=rtol, atol=rtol)
+
+        out = filter_inverse(img, predefined_filter=filt)
+        expected = filter_inverse(img, predefined_filter=expected_filt)
+        assert out.dtype == dtype
+        assert_allclose(out, expected, rtol=rtol, atol=rtol)
+
+        out = wiener(img, predefined_filter=filt)
+        expected = wiener(img, predefined_filter=expected_filt)
+        assert out.dtype == dtype
+        assert_allclose(out, expected, rtol=rtol, atol=rtol)
+
+    def test_wiener_K_shape(self):
+        img = self.img.astype(float)
+        oshape = _oshape(img.shape)
+        expected = wiener(img, predefined_filter=self.f, K=0.25)
+
+        K = cp.full(oshape, 0.25)
+        assert_allclose(wiener(img, predefined_filter=self.f, K=K), expected)
+        K = K[:, :oshape[1] // 2 + 1]
+        assert_allclose(wiener(img, predefined_filter=self.f, K=K), expected)
+
+        # K on the (2M - 1, 2N - 1) grid of earlier versions is still
+        # accepted (as the full or the half spectrum)
+        legacy_shape = tuple(2 * n - 1 for n in img.shape)
+        assert legacy_shape != oshape
+        K = cp.full(legacy_shape, 0.25)
+        out = wiener(img, predefined_filter=self.f, K=K)
+        assert out.shape == img.shape
+        K = K[:, :legacy_shape[1] // 2 + 1]
+        assert_allclose(wiener(img, predefined_filter=self.f, K=K), out)
+        # the filter spectrum cached for the legacy grid is not reused
+        assert_allclose(wiener(img, predefined_filter=self.f, K=0.25),
+                        expected)
+
+        K = cp.full((10, 10), 0.25)
+        with pytest.raises(ValueError):
+            wiener(img, predefined_filter=self.f, K=K)
+
     def test_non_callable(self):
         with pytest.raises(ValueError):
             LPIFilter2D(None)
+
+    @pytest.mark.parametrize('dtype', [cp.float32, cp.float64])
+    def test_analytic_ft_gaussian(self, dtype):
+        sigma = 2.0
+
+        def gaussian(r, c):
+            return cp.exp(-(r * r + c * c) / (2 * sigma ** 2))
+
+        img = self.img.astype(dtype)
+        expected = LPIFilter2D(gaussian)(img)
+        out = LPIFilter2D(None, analytic_ft=gaussian_ft(sigma))(img)
+        assert out.dtype == expected.dtype
+        assert_allclose(out, expected, rtol=1e-4, atol=1e-3)
+
+    @pytest.mark.parametrize('size', [1, 3, 7])
+    def test_analytic_ft_box(self, size):
+        half = (size - 1) / 2
+
+        def box(r, c):
+            return ((cp.abs(r) <= half) & (cp.abs(c) <= half)).astype(float)
+
+        img = self.img.astype(float)
+        expected = LPIFilter2D(box)(img)
+        out = LPIFilter2D(None, analytic_ft=box_ft(size))(img)
+        assert_allclose(out, expected, rtol=1e-7, atol=1e-6)
+
+    def test_analytic_ft_invalid(self):
+        with pytest.raises(ValueError):
+            LPIFilter2D(None, analytic_ft=1)
+        with pytest.raises(ValueError):
+            box_ft(4)
+        with pytest.raises(ValueError):
+            gaussian_ft(0)
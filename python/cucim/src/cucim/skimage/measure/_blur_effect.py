@@ -1,13 +1,67 @@
+import itertools
+
 import cupy as cp
 
 import cucim.skimage._vendored.ndimage as ndi
 
+from .._shared.utils import _supported_float_type
 from ..color import rgb2gray
 from ..util import img_as_float
 
 __all__ = ['blur_effect']
 
 
+@cp.memoize(for_each_device=True)
+def _get_sharpness_kernel(ndim, axis):
+    """Fused Sobel, absolute value, difference and ReLU along one axis.
+
+    For each element of the interior region (excluding 2 elements at the start
+    and 1 element at the end of every axis) computes, in a single pass,
+
+        sharp = abs(sobel(image, axis))
+        T = max(sharp - abs(sobel(filt, axis)), 0)
+
+    where ``image`` and ``filt`` are C-contiguous arrays. Every neighbor of an
+    interior element lies inside the array, so no boundary handling is needed.
+    """
+    # strides (in elements) of the C-contiguous inputs
+    code = [f'ptrdiff_t s_{ndim - 1} = 1;']
+    for k in range(ndim - 2, -1, -1):
+        code.append(f'ptrdiff_t s_{k} = s_{k + 1} * image.shape()[{k + 1}];')
+    center = ' + '.join(
+        f'(_ind.get()[{k}] + 2) * s_{k}' for k in range(ndim)
+    )
+    code.append(f'ptrdiff_t c = {center};')
+    code.append('F g_sharp = 0, g_blur = 0;')
+
+    # separable Sobel weights: [1, 0, -1] along `axis` and [1, 2, 1] / 4
+    # along all other axes
+    for offsets in itertools.product((-1, 0, 1), repeat=ndim):
+        if offsets[axis] == 0:
+            continue
+        w = -float(offsets[axis])
+        for k, o in enumerate(offsets):
+            if k != axis:
+                w *= 0.5 if o == 0 else 0.25
+        offset = ' + '.join(
+            f'({o}) * s_{k}' for k, o in enumerate(offsets) if o != 0
+        )
+        code.append(f'g_sharp += ({w}) * image[c + {offset}];')
+        code.append(f'g_blur += ({w}) * filt[c + {offset}];')
+    code.append("""
+    F im_sharp = g_sharp < 0 ? -g_sharp : g_sharp;
+    F im_blur = g_blur < 0 ? -g_blur : g_blur;
+    sharp = im_sharp;
+    T = im_sharp > im_blur ? im_sharp - im_blur : (F)0;
+    """)
+    return cp.ElementwiseKernel(
+        in_params='raw F image, raw F filt',
+        out_params='F sharp, F T',
+        operation='\n'.join(code),
+        name=f'cucim_blur_effect_sharpness_{ndim}d_axis{axis}',
+    )
+
+
 def blur_effect(image, h_size=11, channel_axis=None, reduce_func=max):
     """Compute a metric that indicates the strength of blur in an image
     (0 for no blur, 1 for maximal blur).
@@ -66,23 +120,32 @@ def blur_effect(image, h_size=11, channel_axis=None, reduce_func=max):
     n_axes = image.ndim
     image = img_as_float(image)
     shape = image.shape
-    B = []
 
-    from ..filters import sobel
+    image = image.astype(_supported_float_type(image.dtype), copy=False)
+    image = cp.ascontiguousarray(image)
+
     host_scalars = True
-    slices = tuple([slice(2, s - 1) for s in shape])
+    interior_shape = tuple(max(s - 3, 0) for s in shape)
+    # workspace holding the interior values of im_sharp and T
+    workspace = cp.empty((2,) + interior_shape, dtype=image.dtype)
+    sums = []
     for ax in range(n_axes):
         filt_im = ndi.uniform_filter1d(image, h_size, axis=ax)
-        im_sharp = cp.abs(sobel(image, axis=ax))
-        im_blur = cp.abs(sobel(filt_im, axis=ax))
-        T = cp.maximum(0, im_sharp - im_blur)
-        if host_scalars:
-            M1 = float(cp.sum(im_sharp[slices]))  # synchronize
-            M2 = float(cp.sum(T[slices]))  # synchronize
-            B.append(abs(M1 - M2) / M1)
-        else:
-            M1 = cp.sum(im_sharp[slices])
-            M2 = cp.sum(T[slices])
-            B.append(cp.abs(M1 - M2) / M1)
+        kernel = _get_sharpness_kernel(n_axes, ax)
+        kernel(image, filt_im, workspace[0], workspace[1])
+        # M1 = sum(im_sharp) and M2 = sum(T) in a single reduction
+        sums.append(workspace.reshape(2, -1).sum(axis=1))
+    # (n_axes, 2) array of the (M1, M2) sums for each axis
+    sums = cp.stack(sums).reshape(n_axes, 2)
+
+    if host_scalars:
+        # single device -> host transfer for all axes
+        B = [abs(M1 - M2) / M1 for M1, M2 in sums.get().tolist()]
+    else:
+        M1, M2 = sums[:, 0], sums[:, 1]
+        B = cp.abs(M1 - M2) / M1
+        if reduce_func is max:
+            return cp.max(B)
+        B = list(B)
 
     return B if reduce_func is None else reduce_func(B)
@@ -3,6 +3,11 @@ import cupyx.scipy.sparse as sparse
 
 __all__ = ['contingency_table']
 
+# Largest number of (dense) table entries for which the table is accumulated
+# with bincount rather than by sorting the (row, col) pairs. A table of up to
+# this size or the number of labeled pixels (whichever is larger) is used.
+_MAX_DENSE_TABLE_SIZE = 1 << 22
+
 
 def contingency_table(im_true, im_test, *, ignore_labels=None,
                       normalize=False):
@@ -30,15 +35,51 @@ def contingency_table(im_true, im_test, *, ignore_labels=None,
 
     im_test_r = im_test.reshape(-1)
     im_true_r = im_true.reshape(-1)
+    # The pixels are accumulated with the narrowest exact weights (a boolean
+    # mask, or none at all) and the table is only converted to float64 and
+    # normalized once its nonzero entries are known.
     if ignore_labels is not None:
         ignore_labels = cp.asarray(ignore_labels)
-        data = cp.isin(im_true_r, ignore_labels, invert=True).astype(float)
-        if normalize:
-            data /= cp.count_nonzero(data)
+        mask = cp.isin(im_true_r, ignore_labels, invert=True)
+        total = cp.count_nonzero(mask)
     else:
-        if normalize:
-            data = cp.full((im_test_r.size,), 1 / im_test_r.size, dtype=float)
+        mask = None
+        total = im_test_r.size
+    # shape of the table (a single device -> host transfer)
+    nrows, ncols = (
+        int(m) + 1
+        for m in cp.stack([im_true_r.max(), im_test_r.max()]).get().tolist()
+    )
+    if nrows * ncols > max(_MAX_DENSE_TABLE_SIZE, im_true_r.size):
+        # sparse accumulation (sorts the (row, col) pairs). Sparse matrices
+        # only support floating point values, but float32 sums of ones are
+        # exact up to 2**24.
+        dtype = cp.float32 if im_true_r.size <= (1 << 24) else cp.float64
+        if mask is None:
+            data = cp.ones((im_test_r.size,), dtype=dtype)
         else:
-            data = cp.ones((im_test_r.size,), dtype=float)
-    cont = sparse.coo_matrix((data, (im_true_r, im_test_r))).tocsr()
+            data = mask.astype(dtype)
+        cont = sparse.coo_matrix(
+            (data, (im_true_r, im_test_r)), shape=(nrows, ncols)
+        ).tocsr()
+        cont.data = cont.data.astype(float)
+        if normalize:
+            cont.data /= total
+        return cont
+
+    # Accumulate the counts for each encoded (row, col) pair in a single pass
+    # and then build the CSR structure from the nonzero entries.
+    keys = im_true_r.astype(cp.int64) * ncols
+    keys += im_test_r.astype(cp.int64, copy=False)
+    flat = cp.bincount(keys, weights=mask, minlength=nrows * ncols)
+    nz = cp.flatnonzero(flat)
+    rows = nz // ncols
+    indices = (nz - rows * ncols).astype(cp.int32)
+    indptr = cp.searchsorted(
+        rows, cp.arange(nrows + 1, dtype=rows.dtype)
+    ).astype(cp.int32)
+    values = flat[nz].astype(float)
+    if normalize:
+        values /= total
+    cont = sparse.csr_matrix((values, indices, indptr), shape=(nrows, ncols))
     return cont
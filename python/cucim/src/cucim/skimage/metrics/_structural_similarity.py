@@ -1,11 +1,7 @@
-import functools
-
 import cupy as cp
 
 import cucim.skimage._vendored.ndimage as ndi
 
-from .._shared import utils
-from .._shared.filters import gaussian
 from .._shared.utils import _supported_float_type, check_shape_equality, warn
 from ..util.arraycrop import crop
 from ..util.dtype import dtype_range
@@ -57,6 +53,48 @@ def _get_ssim_grad_kernel():
     )
 
 
+@cp.memoize(for_each_device=True)
+def _get_ssim_mean_kernel():
+    # computes the mean of the SSIM image without materializing it
+    return cp.ReductionKernel(
+        in_params='float64 cov_norm, F ux, F uy, F uxx, F uyy, F uxy, float64 data_range, float64 K1, float64 K2',  # noqa
+        out_params='float64 mssim',
+        map_expr='_cucim_ssim(cov_norm, ux, uy, uxx, uyy, uxy, data_range, K1, K2)',  # noqa
+        reduce_expr='a + b',
+        post_map_expr='mssim = a / (double)(_in_ind.size() / _out_ind.size())',  # noqa
+        identity='0',
+        name='cucim_ssim_mean',
+        reduce_type='double',
+        preamble="""
+        template <typename F>
+        __device__ double _cucim_ssim(double cov_norm, F ux, F uy, F uxx,
+                                      F uyy, F uxy, double data_range,
+                                      double K1, double K2)
+        {
+            F ssim;
+        """ + _ssim_operation + """
+            return static_cast<double>(ssim);
+        }
+        """
+    )
+
+
+def _separable_filter(x, filter1d, axes, **kwargs):
+    """Apply the 1D filter, `filter1d`, sequentially along each of `axes`.
+
+    The input array is overwritten as it is used as one of the two ping-pong
+    buffers, so only a single additional array is allocated.
+    """
+    if not axes:
+        return x
+    buffers = [cp.empty_like(x), x]
+    for i, ax in enumerate(axes):
+        out = buffers[i % 2]
+        filter1d(x, axis=ax, output=out, **kwargs)
+        x = out
+    return x
+
+
 def structural_similarity(im1, im2,
                           *,
                           win_size=None, gradient=False, data_range=None,
@@ -82,7 +120,7 @@ def structural_similarity(im1, im2,
         maximum possible values). By default, this is estimated from the image
         data type. This estimate may be wrong for floating-point image data.
         Therefore it is recommended to always pass this value explicitly
-        (see note below).
+        (see note below). A 0-dim CuPy array may also be given.
     channel_axis : int or None, optional
         If None, the image is assumed to be a grayscale (single channel) image.
         Otherwise, this parameter indicates which axis of the array corresponds
@@ -107,8 +145,10 @@ def structural_similarity(im1, im2,
 
     Returns
     -------
-    mssim : float
-        The mean structural similarity index over the image.
+    mssim : 0-dim cupy.ndarray
+        The mean structural similarity index over the image. This is a
+        float64 device scalar, so it can be used in further GPU computations
+        without a device to host transfer.
     grad : ndarray
         The gradient of the structural similarity between im1 and im2 [2]_.
         This is only returned if `gradient` is set to True.
@@ -157,46 +197,8 @@ def structural_similarity(im1, im2,
     if isinstance(data_range, cp.ndarray):
         if data_range.ndim != 0:
             raise ValueError("data_range must be a scalar")
-        # need a host scalar
-        data_range = float(data_range)
-
-    if channel_axis is not None:
-        # loop over channels
-        args = dict(win_size=win_size,
-                    gradient=gradient,
-                    data_range=data_range,
-                    channel_axis=None,
-                    gaussian_weights=gaussian_weights,
-                    full=full)
-        args.update(kwargs)
-        nch = im1.shape[channel_axis]
-        mssim = cp.empty(nch, dtype=float_type)
-        if gradient:
-            G = cp.empty(im1.shape, dtype=float_type)
-        if full:
-            S = cp.empty(im1.shape, dtype=float_type)
-        channel_axis = channel_axis % im1.ndim
-        _at = functools.partial(utils.slice_at_axis, axis=channel_axis)
-        for ch in range(nch):
-            ch_result = structural_similarity(im1[_at(ch)],
-                                              im2[_at(ch)], **args)
-            if gradient and full:
-                mssim[ch], G[_at(ch)], S[_at(ch)] = ch_result
-            elif gradient:
-                mssim[ch], G[_at(ch)] = ch_result
-            elif full:
-                mssim[ch], S[_at(ch)] = ch_result
-            else:
-                mssim[ch] = ch_result
-        mssim = mssim.mean()
-        if gradient and full:
-            return mssim, G, S
-        elif gradient:
-            return mssim, G
-        elif full:
-            return mssim, S
-        else:
-            return mssim
+        # A 0-dim device array is passed directly to the kernels (broadcast
+        # as a scalar), avoiding a device -> host synchronization.
 
     K1 = kwargs.pop('K1', 0.01)
     K2 = kwargs.pop('K2', 0.03)
@@ -222,7 +224,15 @@ def structural_similarity(im1, im2,
         else:
             win_size = 7  # backwards compatibility
 
-    if any(s < win_size for s in im1.shape):
+    ndim = im1.ndim
+    if channel_axis is not None:
+        # All channels are processed at once by filtering only along the
+        # non-channel axes.
+        channel_axis = channel_axis % ndim
+    spatial_axes = tuple(ax for ax in range(ndim) if ax != channel_axis)
+    spatial_shape = tuple(im1.shape[ax] for ax in spatial_axes)
+
+    if any(s < win_size for s in spatial_shape):
         raise ValueError(
             'win_size exceeds image extent. '
             'Either ensure that your images are '
@@ -257,20 +267,26 @@ def structural_similarity(im1, im2,
                  "Please specify data_range explicitly to avoid mistakes.",
                  stacklevel=2)
 
-    ndim = im1.ndim
-
+    # The (separable) filters are applied as a sequence of 1D filters along
+    # the spatial axes. Inputs are stacked along a new leading axis so that
+    # several same-shaped arrays can be filtered at once.
+    filter_axes = tuple(ax + 1 for ax in spatial_axes)
     if gaussian_weights:
-        filter_func = gaussian
-        filter_args = {'sigma': sigma, 'truncate': truncate, 'mode': 'reflect'}
+        filter_func = ndi.gaussian_filter1d
+        filter_args = {'sigma': sigma, 'truncate': truncate,
+                       'mode': 'reflect'}
+        if int(truncate * sigma + 0.5) == 0:
+            # zero-radius kernel: filtering is the identity
+            filter_axes = ()
     else:
-        filter_func = ndi.uniform_filter
+        filter_func = ndi.uniform_filter1d
         filter_args = {'size': win_size}
 
     # ndimage filters need floating point data
     im1 = im1.astype(float_type, copy=False)
     im2 = im2.astype(float_type, copy=False)
 
-    NP = win_size ** ndim
+    NP = win_size ** len(spatial_axes)
 
     # filter has already normalized by NP
     if use_sample_covariance:
@@ -278,40 +294,61 @@ def structural_similarity(im1, im2,
     else:
         cov_norm = 1.0  # population covariance to match Wang et. al. 2004
 
-    # compute (weighted) means
-    ux = filter_func(im1, **filter_args)
-    uy = filter_func(im2, **filter_args)
-
-    # compute (weighted) variances and covariances
-    uxx = filter_func(im1 * im1, **filter_args)
-    uyy = filter_func(im2 * im2, **filter_args)
-    uxy = filter_func(im1 * im2, **filter_args)
+    # compute (weighted) means, variances and covariances with a single
+    # filtering call on the stacked inputs
+    stack = cp.empty((5,) + im1.shape, dtype=float_type)
+    stack[0] = im1
+    stack[1] = im2
+    cp.multiply(im1, im1, out=stack[2])
+    cp.multiply(im2, im2, out=stack[3])
+    cp.multiply(im1, im2, out=stack[4])
+    ux, uy, uxx, uyy, uxy = _separable_filter(stack, filter_func,
+                                              filter_axes, **filter_args)
+    del stack
 
+    # to avoid edge effects will ignore filter radius strip around edges
+    pad = (win_size - 1) // 2
+    crop_width = [(pad, pad) if ax in spatial_axes else (0, 0)
+                  for ax in range(ndim)]
+
+    if not (gradient or full):
+        # Reduce directly over the interior without allocating the SSIM image
+        # (mean computed in float64 for accuracy).
+        kernel = _get_ssim_mean_kernel()
+        return kernel(cov_norm, *(crop(u, crop_width)
+                                  for u in (ux, uy, uxx, uyy, uxy)),
+                      data_range, K1, K2)
+
+    S = cp.empty(im1.shape, dtype=float_type)
     if not gradient:
-        S = cp.empty_like(ux)
         kernel = _get_ssim_kernel()
         kernel(cov_norm, ux, uy, uxx, uyy, uxy, data_range, K1, K2, S)
     else:
-        S = cp.empty_like(ux)
-        grad_temp1 = cp.empty_like(ux)
-        grad_temp2 = cp.empty_like(ux)
-        grad_temp3 = cp.empty_like(ux)
+        grad_temps = cp.empty((3,) + im1.shape, dtype=float_type)
         kernel = _get_ssim_grad_kernel()
         kernel(cov_norm, ux, uy, uxx, uyy, uxy, data_range, K1, K2, S,
-               grad_temp1, grad_temp2, grad_temp3)
-
-    # to avoid edge effects will ignore filter radius strip around edges
-    pad = (win_size - 1) // 2
+               *grad_temps)
 
     # compute (weighted) mean of ssim. Use float64 for accuracy.
-    mssim = crop(S, pad).mean(dtype=cp.float64)
+    # Each channel has the same number of pixels, so the mean over all
+    # channels equals the mean of the per-channel means.
+    # Note: mean is a single reduction kernel over the strided interior view
+    # (the division by the pixel count happens in its post-map step), so
+    # neither a contiguous copy nor a separate division is needed. The result
+    # is kept on the device to avoid a host synchronization.
+    mssim = crop(S, crop_width).mean(dtype=cp.float64)
 
     if gradient:
         # The following is Eqs. 7-8 of Avanaki 2009.
-        grad = filter_func(grad_temp1, **filter_args) * im1
-        grad += filter_func(grad_temp2, **filter_args) * im2
-        grad += filter_func(grad_temp3, **filter_args)
-        grad *= (2 / im1.size)
+        grad_temps = _separable_filter(grad_temps, filter_func, filter_axes,
+                                       **filter_args)
+        grad = grad_temps[0] * im1
+        grad += grad_temps[1] * im2
+        grad += grad_temps[2]
+        n_pixels = im1.size
+        if channel_axis is not None:
+            n_pixels //= im1.shape[channel_axis]
+        grad *= (2 / n_pixels)
 
         if full:
             return mssim, grad, S
@@ -24,6 +24,29 @@ def test_contingency_table():
     assert_array_equal(table1, table2)
 
 
+@pytest.mark.parametrize('dense', [True, False])
+def test_contingency_table_ignore_labels(monkeypatch, dense):
+    if not dense:
+        # force the sparse (COO -> CSR) accumulation
+        monkeypatch.setattr(
+            'cucim.skimage.metrics._contingency_table._MAX_DENSE_TABLE_SIZE',
+            0,
+        )
+    im_true = cp.array([0, 1, 1, 2, 2, 2])
+    im_test = cp.array([1, 1, 2, 2, 2, 3])
+
+    table = contingency_table(im_true, im_test, ignore_labels=[0])
+    assert table.dtype == cp.float64
+    expected = cp.array([[0., 0., 0., 0.],
+                         [0., 1., 1., 0.],
+                         [0., 0., 2., 1.]])
+    assert_array_equal(table.toarray(), expected)
+
+    table = contingency_table(im_true, im_test, ignore_labels=[0],
+                              normalize=True)
+    assert_array_equal(table.toarray(), expected / 5)
+
+
 def test_vi():
     im_true = cp.array([1, 2, 3, 4])
     im_test = cp.array([1, 1, 8, 8])
@@ -155,6 +155,41 @@ def test_structural_similarity_multichannel(channel_axis):
         structural_similarity(Xc, Yc, win_size=7, channel_axis=None)
 
 
+@pytest.mark.parametrize('gradient', [False, True])
+@pytest.mark.parametrize('channel_axis', [0, -1])
+def test_structural_similarity_multichannel_matches_per_channel(
+    channel_axis, gradient
+):
+    rstate = cp.random.RandomState(5)
+    Xc = rstate.rand(3, 32, 32) * 255
+    Yc = rstate.rand(3, 32, 32) * 255
+    Xc, Yc = (cp.moveaxis(_arr, 0, channel_axis) for _arr in (Xc, Yc))
+
+    # all channels are processed together and the result stays on the device
+    result = structural_similarity(Xc, Yc, channel_axis=channel_axis,
+                                   data_range=255, gradient=gradient)
+    mssim = result[0] if gradient else result
+    assert isinstance(mssim, cp.ndarray)
+    assert mssim.ndim == 0
+
+    per_channel = [
+        structural_similarity(cp.take(Xc, c, axis=channel_axis),
+                              cp.take(Yc, c, axis=channel_axis),
+                              data_range=255, gradient=gradient)
+        for c in range(3)
+    ]
+    if gradient:
+        assert_almost_equal(
+            mssim, cp.mean(cp.stack([r[0] for r in per_channel]))
+        )
+        assert_almost_equal(
+            result[1], cp.stack([r[1] for r in per_channel],
+                                axis=channel_axis)
+        )
+    else:
+        assert_almost_equal(mssim, cp.mean(cp.stack(per_channel)))
+
+
 @pytest.mark.parametrize('dtype', [cp.uint8, cp.float32, cp.float64])
 def test_structural_similarity_nD(dtype):
     # test 1D through 4D on small random arrays
@@ -222,6 +257,17 @@ def test_mssim_vs_legacy(dtype):
     assert_almost_equal(mssim, mssim_skimage_0pt17, decimal=decimal)
 
 
+@pytest.mark.parametrize('full', [False, True])
+def test_mssim_device_data_range(full):
+    mssim = structural_similarity(cam, cam_noisy, data_range=255.0)
+    result = structural_similarity(
+        cam, cam_noisy, data_range=cp.asarray(255.0), full=full
+    )
+    mssim_device = result[0] if full else result
+    assert isinstance(mssim_device, cp.ndarray)
+    assert_almost_equal(mssim, mssim_device)
+
+
 def test_mssim_mixed_dtype():
     mssim = structural_similarity(
         cam, cam_noisy.astype(cam.dtype), data_range=255.0
@@ -258,6 +304,24 @@ def test_ssim_warns_about_data_range():
     assert_almost_equal(mssim, mssim_mixed)
 
 
+def test_structural_similarity_repeated_calls():
+    # returned arrays must not be overwritten by subsequent calls
+    X = cam[:64, :64]
+    Y = cam_noisy[:64, :64]
+    mssim, grad, S = structural_similarity(X, Y, gradient=True, full=True)
+    mssim_copy, grad_copy, S_copy = mssim.copy(), grad.copy(), S.copy()
+    for _ in range(3):
+        mssim2, grad2, S2 = structural_similarity(X, Y, gradient=True,
+                                                  full=True)
+        structural_similarity(Y, X, gradient=True)
+        structural_similarity(Y, X)
+        assert_equal(mssim2, mssim_copy)
+        assert_equal(grad2, grad_copy)
+        assert_equal(S2, S_copy)
+    assert_equal(grad, grad_copy)
+    assert_equal(S, S_copy)
+
+
 @pytest.mark.parametrize('dtype', [cp.float16, cp.float32, cp.float64])
 def test_structural_similarity_small_image(dtype):
     X = cp.zeros((5, 5), dtype=dtype)
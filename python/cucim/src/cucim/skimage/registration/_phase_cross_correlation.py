@@ -3,20 +3,404 @@ Port of Manuel Guizar's code from:
 http://www.mathworks.com/matlabcentral/fileexchange/18401-efficient-subpixel-image-registration-by-cross-correlation
 """
 
+import functools
 import itertools
 import math
+import string
+import threading
 import warnings
 
 import cupy as cp
 import cupyx.scipy.ndimage as ndi
 import numpy as np
+from cupyx.scipy.fftpack import get_fft_plan
 
 from .._shared.fft import fftmodule as fft
 from ._masked_phase_cross_correlation import _masked_phase_cross_correlation
 
 
+def _complex_dtype(dtype):
+    """Return the complex dtype used when computing the FFT of ``dtype``."""
+    dtype = cp.dtype(dtype)
+    if dtype.kind == 'c':
+        return dtype
+    if dtype in (cp.float16, cp.float32):
+        return cp.dtype(cp.complex64)
+    return cp.dtype(cp.complex128)
+
+
+@functools.lru_cache(maxsize=16)
+def _cached_fft_plan(a_shape, a_dtype, shape, axes, value_type, device_id,
+                     thread_id):
+    # the plan only depends on the shape and dtype of the (C-contiguous)
+    # input, so it is created from an uninitialized array of the same layout
+    a = cp.empty(a_shape, dtype=a_dtype)
+    return get_fft_plan(a, shape=shape, axes=axes, value_type=value_type)
+
+
+def _get_fft_plan(a, shape=None, axes=None, value_type='C2C'):
+    """Return a cuFFT plan over ``axes`` of the C-contiguous array ``a`` (all
+    axes by default), or None for transforms over more than 3 axes.
+
+    cuFFT only supports up to 3-D transforms, so higher dimensional
+    transforms fall back to CuPy's default handling (and its plan cache).
+
+    Plans passed explicitly to the FFT functions bypass CuPy's plan cache, so
+    they are cached here instead. This way, repeated registrations of
+    same-shaped images do not create new plans. As in CuPy's plan cache, a
+    plan is only reused by the thread and on the device that created it.
+    """
+    n_axes = a.ndim if axes is None else len(axes)
+    if n_axes > 3:
+        return None
+    return _cached_fft_plan(
+        a.shape, a.dtype, shape, axes, value_type, cp.cuda.Device().id,
+        threading.get_ident()
+    )
+
+
+@cp.memoize(for_each_device=True)
+def _get_cross_power_kernel():
+    # Computes src * conj(target), optionally normalized to unit magnitude
+    # (with the magnitude limited to at least `eps`), in a single pass.
+    return cp.ElementwiseKernel(
+        in_params='X src, Y target, float64 eps, bool normalize',
+        out_params='Z out',
+        operation="""
+        Z p = Z(src) * conj(Z(target));
+        if (normalize) {
+            double m = abs(p);
+            p *= Z(1.0 / (m > eps ? m : eps));
+        }
+        out = p;
+        """,
+        name='cucim_phase_cross_power'
+    )
+
+
+# squared magnitude (in double precision) of a real or complex value
+_abs2_preamble = """
+template <typename T>
+__device__ double _cucim_abs2(T x) {
+    double v = static_cast<double>(x);
+    return v * v;
+}
+
+template <typename T>
+__device__ double _cucim_abs2(complex<T> x) {
+    double re = x.real(), im = x.imag();
+    return re * re + im * im;
+}
+"""
+
+
+@cp.memoize(for_each_device=True)
+def _get_argmax_abs_kernel():
+    # argmax of the magnitude of a (real or complex) 1-D array, or of each row
+    # of a 2-D array with axis=1, computed from the squared magnitude without
+    # materializing it. As for cupy.argmax, NaN is treated as the largest
+    # value and ties select the first index. The reduced axis is the last
+    # one of the input indexer, so its last coordinate is the index within
+    # the reduced axis.
+    return cp.ReductionKernel(
+        in_params='T x',
+        out_params='int64 idx',
+        map_expr=('_cucim_argmax_t(_cucim_abs2(x), '
+                  '_in_ind.get()[_in_ind.ndim - 1])'),
+        reduce_expr='_cucim_argmax(a, b)',
+        post_map_expr='idx = a.index',
+        identity='_cucim_argmax_t()',
+        reduce_type='_cucim_argmax_t',
+        name='cucim_argmax_abs',
+        preamble="""
+        struct _cucim_argmax_t {
+            double value;
+            long long index;
+            __device__ _cucim_argmax_t() : value(-1.0), index(-1) {}
+            __device__ _cucim_argmax_t(double v, long long i) :
+                value(v), index(i) {}
+        };
+
+        __device__ _cucim_argmax_t _cucim_argmax(const _cucim_argmax_t& a,
+                                                 const _cucim_argmax_t& b)
+        {
+            bool a_nan = a.value != a.value;
+            bool b_nan = b.value != b.value;
+            if (a_nan != b_nan) {
+                return a_nan ? a : b;
+            }
+            if (!a_nan && a.value != b.value) {
+                return a.value > b.value ? a : b;
+            }
+            return a.index < b.index ? a : b;
+        }
+        """ + _abs2_preamble
+    )
+
+
+def _unravel_index(flat_index, shape):
+    """Device-side equivalent of ``unravel_index`` with the coordinates along
+    a new last axis.
+
+    Unlike ``cupy.unravel_index``, there is no bounds check, which would
+    require a device -> host synchronization.
+    """
+    coords = []
+    for dim in shape[::-1]:
+        coords.append(flat_index % dim)
+        flat_index = flat_index // dim
+    return cp.stack(coords[::-1], axis=-1)
+
+
+def _argmax_abs(x):
+    """Return the index of the element of largest magnitude as an int64
+    device array of shape ``(x.ndim,)``."""
+    flat_index = _get_argmax_abs_kernel()(cp.ravel(x))
+    return _unravel_index(flat_index, x.shape)
+
+
+def _wrap_shift(maxima, shape):
+    """Convert cross-correlation peak indices to signed shifts."""
+    shape = cp.asarray(shape)
+    return cp.where(maxima > shape // 2, maxima - shape, maxima)
+
+
+@cp.fuse()
+def _any_nan(a, b, c):
+    return cp.isnan(a) | cp.isnan(b) | cp.isnan(c)
+
+
+@cp.memoize(for_each_device=True)
+def _get_energy_kernel():
+    # sum of the squared magnitudes, without a temporary for abs(x)**2
+    return cp.ReductionKernel(
+        in_params='T x',
+        out_params='float64 energy',
+        map_expr='_cucim_abs2(x)',
+        reduce_expr='a + b',
+        post_map_expr='energy = a',
+        identity='0',
+        reduce_type='double',
+        name='cucim_spectrum_energy',
+        preamble=_abs2_preamble,
+    )
+
+
+@cp.memoize(for_each_device=True)
+def _get_dft_twiddle_kernel():
+    # exp(-2j * pi * k * f) evaluated directly in the output (complex) dtype
+    return cp.ElementwiseKernel(
+        in_params='float64 k, float64 f',
+        out_params='T out',
+        operation="""
+        double s, c;
+        sincospi(-2.0 * k * f, &s, &c);
+        out = T(c, s);
+        """,
+        name='cucim_upsampled_dft_twiddle'
+    )
+
+
+@cp.memoize(for_each_device=True)
+def _get_correlation_kernel():
+    # Pearson correlation coefficient of x and y from the sums of x, y, x*x,
+    # y*y and x*y accumulated (in double precision) in a single pass.
+    return cp.ReductionKernel(
+        in_params='X x, Y y',
+        out_params='float64 corr',
+        map_expr='_cucim_corr_t(x, y)',
+        reduce_expr='a + b',
+        post_map_expr="""
+        double n = _in_ind.size() / _out_ind.size();
+        double vx = a.sxx - a.sx * a.sx / n;
+        double vy = a.syy - a.sy * a.sy / n;
+        double cov = a.sxy - a.sx * a.sy / n;
+        corr = cov / sqrt(vx * vy);
+        """,
+        identity='_cucim_corr_t()',
+        reduce_type='_cucim_corr_t',
+        name='cucim_correlation',
+        preamble="""
+        struct _cucim_corr_t {
+            double sx, sy, sxx, syy, sxy;
+            __device__ _cucim_corr_t() :
+                sx(0), sy(0), sxx(0), syy(0), sxy(0) {}
+            __device__ _cucim_corr_t(double x, double y) :
+                sx(x), sy(y), sxx(x * x), syy(y * y), sxy(x * y) {}
+        };
+
+        __device__ _cucim_corr_t operator+(const _cucim_corr_t& a,
+                                           const _cucim_corr_t& b)
+        {
+            _cucim_corr_t c;
+            c.sx = a.sx + b.sx;
+            c.sy = a.sy + b.sy;
+            c.sxx = a.sxx + b.sxx;
+            c.syy = a.syy + b.syy;
+            c.sxy = a.sxy + b.sxy;
+            return c;
+        }
+        """
+    )
+
+
+# Largest amount of work (number of output elements times the number of input
+# elements) for which the upsampled DFT is evaluated directly by
+# _get_direct_dft_kernel instead of as a sequence of matrix products.
+_DIRECT_DFT_MAX_WORK = 1 << 24
+
+_direct_dft_block_size = 128
+
+_direct_dft_source = """
+#include <cupy/complex.cuh>
+
+extern "C" __global__ void {name}(
+        const complex<{real_type}>* data, complex<{real_type}>* out,
+        const double* k0, const double* k1, const double* k2,
+        const double* f0, const double* f1, const double* f2,
+        const int n0, const int n1, const int n2,
+        const int u1, const int u2)
+{{
+    __shared__ {real_type} s_re[{block_size}];
+    __shared__ {real_type} s_im[{block_size}];
+
+    // each block computes a single output element
+    const int o = blockIdx.x;
+    const double p0 = k0[o / (u1 * u2)];
+    const double p1 = k1[(o / u2) % u1];
+    const double p2 = k2[o % u2];
+
+    const long long n = (long long)n0 * n1 * n2;
+    {real_type} acc_re = 0, acc_im = 0;
+    for (long long j = threadIdx.x; j < n; j += blockDim.x) {{
+        int a2 = j % n2;
+        int a1 = (j / n2) % n1;
+        int a0 = j / ((long long)n1 * n2);
+        // twiddle factor exp(-2j * pi * (k . f)) generated on the fly
+        {real_type} phase = -2.0 * (p0 * f0[a0] + p1 * f1[a1] + p2 * f2[a2]);
+        {real_type} s, c;
+        {sincospi}(phase, &s, &c);
+        complex<{real_type}> v = data[j];
+        acc_re += v.real() * c - v.imag() * s;
+        acc_im += v.real() * s + v.imag() * c;
+    }}
+    s_re[threadIdx.x] = acc_re;
+    s_im[threadIdx.x] = acc_im;
+    __syncthreads();
+    for (int stride = blockDim.x / 2; stride > 0; stride >>= 1) {{
+        if (threadIdx.x < stride) {{
+            s_re[threadIdx.x] += s_re[threadIdx.x + stride];
+            s_im[threadIdx.x] += s_im[threadIdx.x + stride];
+        }}
+        __syncthreads();
+    }}
+    if (threadIdx.x == 0) {{
+        out[o] = complex<{real_type}>(s_re[0], s_im[0]);
+    }}
+}}
+"""
+
+
+@cp.memoize(for_each_device=True)
+def _get_direct_dft_kernel(dtype_char):
+    """Upsampled DFT of (up to) 3-D data with all twiddle factors generated
+    on the fly, so that no DFT matrices are materialized.
+
+    The data is viewed as 3-D (with leading singleton axes as needed). Launch
+    with one block of ``_direct_dft_block_size`` threads per output element.
+    """
+    if dtype_char == 'F':
+        real_type, sincospi = 'float', 'sincospif'
+    else:
+        real_type, sincospi = 'double', 'sincospi'
+    name = f'cucim_upsampled_dft_direct_{real_type}'
+    return cp.RawKernel(
+        _direct_dft_source.format(
+            name=name, real_type=real_type, sincospi=sincospi,
+            block_size=_direct_dft_block_size,
+        ),
+        name,
+    )
+
+
+def _upsampled_dft_direct(data, sample_positions, frequencies):
+    """Evaluate the upsampled DFT of (up to 3-D) ``data`` in a single kernel.
+
+    ``sample_positions`` and ``frequencies`` are, for each axis, the
+    (float64) output sample positions and the DFT frequencies of the data.
+    """
+    # (the kernel reads the positions as doubles)
+    sample_positions = [k.astype(cp.float64, copy=False)
+                        for k in sample_positions]
+    ups_shape = tuple(k.size for k in sample_positions)
+    n_pad = 3 - data.ndim
+    zero = cp.zeros((1,), dtype=cp.float64)
+    sample_positions = [zero] * n_pad + list(sample_positions)
+    frequencies = [zero] * n_pad + list(frequencies)
+    n = (1,) * n_pad + data.shape
+    u = (1,) * n_pad + ups_shape
+
+    out = cp.empty(ups_shape, dtype=data.dtype)
+    kernel = _get_direct_dft_kernel(data.dtype.char)
+    kernel(
+        (out.size,), (_direct_dft_block_size,),
+        (data, out, *sample_positions, *frequencies,
+         np.int32(n[0]), np.int32(n[1]), np.int32(n[2]),
+         np.int32(u[1]), np.int32(u[2])),
+    )
+    return out
+
+
+def _full_spectrum(half, shape):
+    """Expand the output of ``rfftn`` to the full spectrum of ``fftn``.
+
+    The missing bins along the last axis follow from the Hermitian symmetry
+    ``X[k] = conj(X[-k])`` of the spectrum of a real signal of ``shape``. Any
+    leading axes of ``half`` beyond ``len(shape)`` are batch axes.
+    """
+    n = shape[-1]
+    tail = half[..., (n + 1) // 2 - 1:0:-1].conj()
+    for ax in range(half.ndim - len(shape), half.ndim - 1):
+        tail = cp.roll(cp.flip(tail, axis=ax), 1, axis=ax)
+    return cp.concatenate([half, tail], axis=-1)
+
+
+def _spectrum_energy(freq, half_n=None):
+    """Sum of the squared magnitudes of all bins of a spectrum.
+
+    If ``half_n`` is given, ``freq`` is the output of ``rfftn`` for a real
+    signal with ``half_n`` samples along the last axis, and the sum is taken
+    over the corresponding full spectrum.
+
+    The result is a 0-dim (float64) device array.
+    """
+    kernel = _get_energy_kernel()
+    energy = kernel(freq)
+    if half_n is None:
+        return energy
+    # all bins except the zero frequency (and the Nyquist frequency for even
+    # sizes) have a conjugate counterpart in the redundant half
+    energy *= 2
+    energy -= kernel(freq[..., 0])
+    if half_n % 2 == 0:
+        energy -= kernel(freq[..., -1])
+    return energy
+
+
+@functools.lru_cache(maxsize=128)
+def _dft_frequencies(n_items, upsample_factor, sign, device_id):
+    """DFT frequencies of ``n_items`` samples upsampled by
+    ``upsample_factor`` as a (read-only) float64 array on the device.
+
+    The sign of the DFT exponent is folded into the frequencies. The small
+    array is computed on the host and cached, as the same sizes are used
+    repeatedly.
+    """
+    return cp.asarray(-sign * np.fft.fftfreq(n_items, upsample_factor))
+
+
 def _upsampled_dft(data, upsampled_region_size,
-                   upsample_factor=1, axis_offsets=None):
+                   upsample_factor=1, axis_offsets=None, sign=-1):
     """
     Upsampled DFT by matrix multiplication.
 
@@ -45,7 +429,11 @@ def _upsampled_dft(data, upsampled_region_size,
         The upsampling factor.  Defaults to 1.
     axis_offsets : tuple of integers, optional
         The offsets of the region to be sampled.  Defaults to None (uses
-        image center)
+        image center). May also be given as a 1-D device array.
+    sign : {-1, 1}, optional
+        Sign of the exponent of the DFT. The default (-1) computes the
+        forward DFT, while 1 gives ``_upsampled_dft(data.conj()).conj()``
+        without conjugating ``data`` or the output.
 
     Returns
     -------
@@ -67,21 +455,47 @@ def _upsampled_dft(data, upsampled_region_size,
             raise ValueError("number of axis offsets must be equal to input "
                              "data's number of dimensions.")
 
-    im2pi = 1j * 2 * np.pi
+    # CuPy Backend: use kernel of same precision as the data
+    kernel_dtype = _complex_dtype(data.dtype)
+    twiddle = _get_dft_twiddle_kernel()
 
-    dim_properties = list(zip(data.shape, upsampled_region_size, axis_offsets))
+    dim_properties = zip(data.shape, upsampled_region_size, axis_offsets)
+
+    # the (small) sample positions and frequencies are computed on the host
+    sample_positions = []
+    frequencies = []
+    for (n_items, ups_size, ax_offset) in dim_properties:
+        if isinstance(ax_offset, cp.ndarray):
+            # offset computed on the device
+            k = cp.arange(ups_size, dtype=cp.float64) - ax_offset
+        else:
+            k = cp.asarray(np.arange(ups_size, dtype=np.float64) - ax_offset)
+        sample_positions.append(k)
+        frequencies.append(_dft_frequencies(n_items, upsample_factor, sign,
+                                            cp.cuda.Device().id))
 
-    for (n_items, ups_size, ax_offset) in dim_properties[::-1]:
-        kernel = ((cp.arange(ups_size) - ax_offset)[:, None]
-                  * fft.fftfreq(n_items, upsample_factor))
-        kernel = cp.exp(-im2pi * kernel)
-        # CuPy Backend: use kernel of same precision as the data
-        kernel = kernel.astype(data.dtype, copy=False)
+    work = math.prod(upsampled_region_size) * data.size
+    if data.ndim <= 3 and work <= _DIRECT_DFT_MAX_WORK:
+        # For small problems, a single kernel evaluating the DFT sum directly
+        # avoids the launch overhead of the matrix products below.
+        data = cp.ascontiguousarray(data, dtype=kernel_dtype)
+        return _upsampled_dft_direct(data, sample_positions, frequencies)
 
-        # Equivalent to:
-        #   data[i, j, k] = kernel[i, :] @ data[j, k].T
-        data = cp.tensordot(kernel, data, axes=(1, -1))
-    return data
+    kernels = []
+    for k, f in zip(sample_positions, frequencies):
+        # the complex exponential is evaluated in a single kernel
+        kernel = cp.empty((k.size, f.size), dtype=kernel_dtype)
+        twiddle(k[:, None], f, kernel)
+        kernels.append(kernel)
+
+    # Apply the DFT matrix of each axis as a single contraction, e.g. in 2D:
+    #   out[i, j] = sum_{a, b} kernels[0][i, a] * kernels[1][j, b] * data[a, b]
+    # letting einsum choose the order of the pairwise contractions.
+    in_labels = string.ascii_lowercase[:data.ndim]
+    out_labels = string.ascii_uppercase[:data.ndim]
+    subscripts = ','.join(o + i for o, i in zip(out_labels, in_labels))
+    subscripts += f',{in_labels}->{out_labels}'
+    return cp.einsum(subscripts, *kernels, data, optimize='greedy')
 
 
 def _compute_phasediff(cross_correlation_max):
@@ -127,10 +541,12 @@ def _disambiguate_shift(reference_image, moving_image, shift):
     one with the highest cross-correlation.
 
     The strategy we use is to perform the shift on the moving image *using the
-    'grid-wrap' mode* in `scipy.ndimage`. The moving image's original borders
-    then define $2^n$ quadrants, which we cross-correlate with the reference
-    image in turn using slicing. The entire operation is thus $O(2^n + m)$,
-    where $m$ is the number of pixels in the image (and typically dominates).
+    'grid-wrap' mode* in `scipy.ndimage` (i.e. a circular roll by the integer
+    part of the shift, followed by spline interpolation of any fractional
+    remainder). The moving image's original borders then define $2^n$
+    quadrants, which we cross-correlate with the reference image in turn using
+    slicing. The entire operation is thus $O(2^n + m)$, where $m$ is the
+    number of pixels in the image (and typically dominates).
 
     Parameters
     ----------
@@ -153,23 +569,37 @@ def _disambiguate_shift(reference_image, moving_image, shift):
     negative_shift = [shift_i - s
                       for shift_i, s in zip(positive_shift, shape)]
     subpixel = any(s % 1 != 0 for s in shift)
-    interp_order = 3 if subpixel else 0
-    shifted = ndi.shift(
-        moving_image, shift, mode='grid-wrap', order=interp_order
-    )
+    # A 'grid-wrap' shift by an integer amount is a circular roll, so only the
+    # fractional remainder of the shift (if any) needs to be interpolated.
+    integer_shift = tuple(math.floor(s) for s in shift)
+    shifted = cp.roll(moving_image, integer_shift,
+                      axis=tuple(range(moving_image.ndim)))
+    if subpixel:
+        fractional_shift = tuple(
+            s - i for s, i in zip(shift, integer_shift)
+        )
+        shifted = ndi.shift(
+            shifted, fractional_shift, mode='grid-wrap', order=3
+        )
     indices = tuple(round(s) for s in positive_shift)
     splits_per_dim = [(slice(0, i), slice(i, None)) for i in indices]
-    max_corr = -1.0
-    max_slice = None
-    for test_slice in itertools.product(*splits_per_dim):
-        reference_tile = cp.reshape(reference_image[test_slice], -1)
-        moving_tile = cp.reshape(shifted[test_slice], -1)
-        corr = -1.0
+    test_slices = list(itertools.product(*splits_per_dim))
+    # The correlations of all candidates are kept on the device, so that
+    # there is a single device -> host transfer for the selected candidate.
+    # The tiles partition the image, so together the per-tile reductions
+    # below read every pixel exactly once (a segmented reduction over a
+    # quadrant label image would need the same single pass, but with atomic
+    # updates and an additional label array).
+    corrs = cp.full((len(test_slices),), -1.0)
+    corr_kernel = _get_correlation_kernel()
+    for i, test_slice in enumerate(test_slices):
+        reference_tile = reference_image[test_slice]
         if reference_tile.size > 2:
-            corr = float(cp.corrcoef(reference_tile, moving_tile)[0, 1])
-        if corr > max_corr:
-            max_corr = corr
-            max_slice = test_slice
+            corr_kernel(reference_tile, shifted[test_slice], corrs[i])
+    # tiles with a constant value have an undefined (NaN) correlation
+    # (cp.where rather than boolean mask assignment, which synchronizes)
+    corrs = cp.where(cp.isnan(corrs), -1.0, corrs)
+    max_slice = test_slices[int(cp.argmax(corrs))]
     real_shift_acc = []
     for sl, pos_shift, neg_shift in zip(
         max_slice, positive_shift, negative_shift
@@ -182,12 +612,76 @@ def _disambiguate_shift(reference_image, moving_image, shift):
     return real_shift
 
 
+def _refine_shift(image_product, shift, upsample_factor):
+    """Refine a whole-pixel shift estimate to ``1 / upsample_factor`` of a
+    pixel by a matrix multiply DFT of the (full) cross-power spectrum
+    ``image_product`` around the estimate.
+
+    ``shift`` is a 1-D device array. Returns the refined shift (as a float64
+    device array) and the cross-correlation at its maximum, without any
+    device -> host synchronization.
+    """
+    # Initial shift estimate in upsampled grid
+    upsample_factor = float(upsample_factor)
+    shift = cp.around(shift * upsample_factor) / upsample_factor
+    upsampled_region_size = math.ceil(upsample_factor * 1.5)
+    # Center of output array at dftshift + 1
+    dftshift = float(upsampled_region_size // 2)
+    # Matrix multiply DFT around the current shift estimate
+    sample_region_offset = dftshift - shift * upsample_factor
+    cross_correlation = _upsampled_dft(image_product,
+                                       upsampled_region_size,
+                                       upsample_factor,
+                                       sample_region_offset,
+                                       sign=1)
+
+    # Locate maximum and map back to original pixel grid
+    maxima = _argmax_abs(cross_correlation)
+    CCmax = cross_correlation[tuple(maxima)]
+
+    shift = shift + (maxima - dftshift) / upsample_factor
+    return shift, CCmax
+
+
+def _phase_cross_correlation_cpu(reference_image, moving_image, *,
+                                 disambiguate=False, dtype=None, **kwargs):
+    """Register NumPy arrays on the CPU via scikit-image.
+
+    As on the GPU, `dtype` sets the precision of the computation (by casting
+    the inputs to it) and is unused when masks are supplied.
+    """
+    try:
+        from skimage.registration import phase_cross_correlation as _pcc_cpu
+    except ImportError as e:
+        raise ImportError(
+            "scikit-image is required to register NumPy arrays. Either "
+            "install it or pass CuPy arrays instead."
+        ) from e
+    masked = (kwargs.get('reference_mask') is not None
+              or kwargs.get('moving_mask') is not None)
+    if dtype is not None and not masked:
+        dtype = np.dtype(dtype)
+        if dtype.kind not in 'fc':
+            raise ValueError("dtype must be a floating point or complex dtype")
+        complex_dtype = _complex_dtype(dtype)
+        real_dtype = np.dtype(complex_dtype.char.lower())
+        reference_image, moving_image = (
+            image.astype(complex_dtype if image.dtype.kind == 'c'
+                         else real_dtype, copy=False)
+            for image in (reference_image, moving_image)
+        )
+    if disambiguate:
+        # only pass the keyword when needed: older scikit-image lacks it
+        kwargs['disambiguate'] = True
+    return _pcc_cpu(reference_image, moving_image, **kwargs)
+
+
 def phase_cross_correlation(reference_image, moving_image, *,
                             upsample_factor=1, space="real",
                             disambiguate=False,
                             return_error=True, reference_mask=None,
                             moving_mask=None, overlap_ratio=0.3,
-                            normalization="phase"):
+                            normalization="phase", dtype=None):
     """Efficient subpixel image translation registration by cross-correlation.
 
     This code gives the same precision as the FFT upsampled cross-correlation
@@ -245,6 +739,14 @@ def phase_cross_correlation(reference_image, moving_image, *,
         The type of normalization to apply to the cross-correlation. This
         parameter is unused when masks (`reference_mask` and `moving_mask`) are
         supplied.
+    dtype : dtype, optional
+        Floating point (or complex) dtype in which the cross-correlation is
+        computed. By default, single precision is used for float16, float32
+        and complex64 inputs and double precision otherwise. Passing e.g.
+        ``cupy.float32`` for double precision inputs halves the memory traffic
+        and is much faster on GPUs with low double precision throughput, at
+        the cost of a small loss of accuracy. This parameter is unused when
+        masks (`reference_mask` and `moving_mask`) are supplied.
 
     Returns
     -------
@@ -278,6 +780,11 @@ def phase_cross_correlation(reference_image, moving_image, *,
     When masks are provided, a masked normalized cross-correlation algorithm is
     used [5]_, [6]_.
 
+    If both images are NumPy arrays, the registration is run on the CPU by
+    :func:`skimage.registration.phase_cross_correlation` (``dtype`` is
+    ignored in that case). For small images this avoids the host <-> device
+    transfers and kernel launch overhead, which would otherwise dominate.
+
     References
     ----------
     .. [1] Manuel Guizar-Sicairos, Samuel T. Thurman, and James R. Fienup,
@@ -309,6 +816,16 @@ def phase_cross_correlation(reference_image, moving_image, *,
             stacklevel=3,
         )
 
+    if (isinstance(reference_image, np.ndarray)
+            and isinstance(moving_image, np.ndarray)):
+        return _phase_cross_correlation_cpu(
+            reference_image, moving_image, upsample_factor=upsample_factor,
+            space=space, disambiguate=disambiguate,
+            return_error=return_error, reference_mask=reference_mask,
+            moving_mask=moving_mask, overlap_ratio=overlap_ratio,
+            normalization=normalization, dtype=dtype,
+        )
+
     if (reference_mask is not None) or (moving_mask is not None):
         shift = _masked_phase_cross_correlation(reference_image, moving_image,
                                                 reference_mask, moving_mask,
@@ -323,83 +840,104 @@ def phase_cross_correlation(reference_image, moving_image, *,
     if reference_image.shape != moving_image.shape:
         raise ValueError("images must be same shape")
 
+    if dtype is not None:
+        dtype = cp.dtype(dtype)
+        if dtype.kind not in 'fc':
+            raise ValueError("dtype must be a floating point or complex dtype")
+        dtype = _complex_dtype(dtype)
+
+    shape = reference_image.shape
+    # whether only half of the spectrum (as computed by rfftn) is stored
+    half_spectrum = False
     # assume complex data is already in Fourier space
     if space.lower() == 'fourier':
         src_freq = reference_image
         target_freq = moving_image
+        if dtype is not None:
+            src_freq = src_freq.astype(dtype, copy=False)
+            target_freq = target_freq.astype(dtype, copy=False)
+        fft_plan = None
     # real data needs to be fft'd.
     elif space.lower() == 'real':
-        src_freq = fft.fftn(reference_image)
-        target_freq = fft.fftn(moving_image)
+        if dtype is None:
+            complex_dtype = _complex_dtype(
+                cp.promote_types(reference_image.dtype, moving_image.dtype)
+            )
+        else:
+            complex_dtype = dtype
+        # The spectra of real images are Hermitian, so for real inputs only
+        # the non-redundant half along the last axis is computed.
+        half_spectrum = (reference_image.dtype.kind != 'c'
+                         and moving_image.dtype.kind != 'c')
+        if half_spectrum:
+            pair_dtype = cp.dtype(complex_dtype.char.lower())
+        else:
+            pair_dtype = complex_dtype
+        # Both images are cast to the transform precision and copied into a
+        # single C-contiguous array, so that their (independent) forward
+        # transforms are computed concurrently by one batched cuFFT call.
+        pair = cp.empty((2,) + shape, dtype=pair_dtype)
+        pair[0] = reference_image
+        pair[1] = moving_image
+        axes = tuple(range(1, pair.ndim))
+        if half_spectrum:
+            pair_plan = _get_fft_plan(pair, axes=axes, value_type='R2C')
+            src_freq, target_freq = fft.rfftn(pair, axes=axes, plan=pair_plan)
+            fft_plan = _get_fft_plan(src_freq, shape=shape, value_type='C2R')
+        else:
+            pair_plan = _get_fft_plan(pair, axes=axes)
+            src_freq, target_freq = fft.fftn(pair, axes=axes, plan=pair_plan)
+            fft_plan = _get_fft_plan(src_freq)
+        del pair
     else:
         raise ValueError('space argument must be "real" of "fourier"')
 
     # Whole-pixel shift - Compute cross-correlation by an IFFT
-    shape = src_freq.shape
-    image_product = src_freq * target_freq.conj()
-    if normalization == "phase":
-        eps = cp.finfo(image_product.real.dtype).eps
-        image_product /= cp.maximum(cp.abs(image_product), 100 * eps)
-    elif normalization is not None:
+    if normalization not in ("phase", None):
         raise ValueError("normalization must be either phase or None")
-    cross_correlation = fft.ifftn(image_product)
-
-    # Locate maximum
-    maxima = np.unravel_index(
-        int(cp.argmax(cp.abs(cross_correlation))), cross_correlation.shape
+    image_product = cp.empty(
+        src_freq.shape,
+        dtype=_complex_dtype(
+            cp.promote_types(src_freq.dtype, target_freq.dtype)
+        ),
     )
-    midpoint = tuple(float(axis_size // 2) for axis_size in shape)
-    shift = tuple(_max - axis_size if _max > mid else _max
-                  for _max, mid, axis_size in zip(maxima, midpoint, shape))
+    # (finfo of a complex dtype describes its real components)
+    eps = np.finfo(image_product.dtype).eps
+    _get_cross_power_kernel()(src_freq, target_freq, 100 * eps,
+                              normalization == "phase", image_product)
+    if half_spectrum:
+        cross_correlation = fft.irfftn(image_product, s=shape, plan=fft_plan)
+    else:
+        cross_correlation = fft.ifftn(image_product, plan=fft_plan)
+
+    # Locate maximum. The shift is kept on the device (including the subpixel
+    # refinement below) until a single transfer to the host.
+    maxima = _argmax_abs(cross_correlation)
+    shift = _wrap_shift(maxima, shape)
 
     if upsample_factor == 1:
         if return_error:
-            sabs = cp.abs(src_freq)
-            sabs *= sabs
-            tabs = cp.abs(target_freq)
-            tabs *= tabs
-            src_amp = np.sum(sabs) / src_freq.size
-            target_amp = np.sum(tabs) / target_freq.size
-            CCmax = cross_correlation[maxima]
+            half_n = shape[-1] if half_spectrum else None
+            n_total = math.prod(shape)
+            src_amp = _spectrum_energy(src_freq, half_n) / n_total
+            target_amp = _spectrum_energy(target_freq, half_n) / n_total
+            CCmax = cross_correlation[tuple(maxima)]
     # If upsampling > 1, then refine estimate with matrix multiply DFT
     else:
-        # Initial shift estimate in upsampled grid
-        # shift = cp.around(shift * upsample_factor) / upsample_factor
-        upsample_factor = float(upsample_factor)
-        shift = tuple(round(s * upsample_factor) / upsample_factor
-                      for s in shift)
-        upsampled_region_size = math.ceil(upsample_factor * 1.5)
-        # Center of output array at dftshift + 1
-        dftshift = float(upsampled_region_size // 2)
-        # Matrix multiply DFT around the current shift estimate
-        sample_region_offset = tuple(
-            dftshift - s * upsample_factor for s in shift
-        )
-        cross_correlation = _upsampled_dft(image_product.conj(),
-                                           upsampled_region_size,
-                                           upsample_factor,
-                                           sample_region_offset).conj()
-
-        # Locate maximum and map back to original pixel grid
-        maxima = np.unravel_index(int(cp.argmax(cp.abs(cross_correlation))),
-                                  cross_correlation.shape)
-        CCmax = cross_correlation[maxima]
-
-        maxima = tuple(float(m) - dftshift for m in maxima)
-        shift = tuple(s + m / upsample_factor for s, m in zip(shift, maxima))
+        if half_spectrum:
+            image_product = _full_spectrum(image_product, shape)
+        shift, CCmax = _refine_shift(image_product, shift, upsample_factor)
 
         if return_error:
-            src_amp = cp.abs(src_freq)
-            src_amp *= src_amp
-            src_amp = cp.sum(src_amp)
-            target_amp = cp.abs(target_freq)
-            target_amp *= target_amp
-            target_amp = cp.sum(target_amp)
+            half_n = shape[-1] if half_spectrum else None
+            src_amp = _spectrum_energy(src_freq, half_n)
+            target_amp = _spectrum_energy(target_freq, half_n)
 
     # If its only one row or column the shift along that dimension has no
     # effect. We set to zero.
     shift = tuple(
-        s if axis_size != 1 else 0 for s, axis_size in zip(shift, shape)
+        s if axis_size != 1 else 0
+        for s, axis_size in zip(shift.get().tolist(), shape)
     )
 
     if disambiguate:
@@ -410,7 +948,8 @@ def phase_cross_correlation(reference_image, moving_image, *,
 
     if return_error:
         # Redirect user to masked_phase_cross_correlation if NaNs are observed
-        if cp.isnan(CCmax) or cp.isnan(src_amp) or cp.isnan(target_amp):
+        # (a single kernel and device -> host transfer)
+        if _any_nan(CCmax, src_amp, target_amp):
             raise ValueError(
                 "NaN values found, please remove NaNs from your "
                 "input data or use the `reference_mask`/`moving_mask` "
@@ -423,3 +962,96 @@ def phase_cross_correlation(reference_image, moving_image, *,
             _compute_phasediff(CCmax)
     else:
         return shift
+
+
+def phase_cross_correlation_batch(reference_image, moving_images, *,
+                                  upsample_factor=1, normalization="phase",
+                                  dtype=None):
+    """Register a stack of images to a single reference image.
+
+    This is equivalent to calling `phase_cross_correlation` (in real space,
+    without masks and without disambiguation) for each of the images in
+    ``moving_images``, but the transforms, the cross-power spectra and the
+    whole-pixel peak search are each computed for the whole stack at once.
+
+    Parameters
+    ----------
+    reference_image : array
+        Reference image.
+    moving_images : array
+        Stack of images to register, with the images along the first axis.
+        ``moving_images.shape[1:]`` must equal ``reference_image.shape``.
+    upsample_factor : int, optional
+        Upsampling factor. See `phase_cross_correlation`.
+    normalization : {"phase", None}
+        The type of normalization to apply to the cross-correlation.
+    dtype : dtype, optional
+        Floating point (or complex) dtype in which the cross-correlation is
+        computed. See `phase_cross_correlation`.
+
+    Returns
+    -------
+    shifts : (N, ndim) numpy.ndarray
+        Shift vectors (in pixels) required to register each of the
+        ``moving_images`` with ``reference_image``.
+    """
+    if moving_images.shape[1:] != reference_image.shape:
+        raise ValueError("images must be same shape")
+    if normalization not in ("phase", None):
+        raise ValueError("normalization must be either phase or None")
+    if dtype is None:
+        dtype = cp.promote_types(reference_image.dtype, moving_images.dtype)
+    else:
+        dtype = cp.dtype(dtype)
+        if dtype.kind not in 'fc':
+            raise ValueError("dtype must be a floating point or complex dtype")
+    complex_dtype = _complex_dtype(dtype)
+
+    shape = reference_image.shape
+    axes = tuple(range(1, moving_images.ndim))
+    # cuFFT computes the transforms of all moving images as a single batch
+    half_spectrum = (reference_image.dtype.kind != 'c'
+                     and moving_images.dtype.kind != 'c')
+    if half_spectrum:
+        float_dtype = cp.dtype(complex_dtype.char.lower())
+        src_freq = fft.rfftn(cp.ascontiguousarray(reference_image,
+                                                  float_dtype))
+        target_freq = fft.rfftn(cp.ascontiguousarray(moving_images,
+                                                     float_dtype), axes=axes)
+    else:
+        src_freq = fft.fftn(cp.ascontiguousarray(reference_image,
+                                                 complex_dtype))
+        target_freq = fft.fftn(cp.ascontiguousarray(moving_images,
+                                                    complex_dtype), axes=axes)
+
+    # the reference spectrum is broadcast against the stack
+    image_product = cp.empty(target_freq.shape, dtype=complex_dtype)
+    eps = np.finfo(image_product.dtype).eps
+    _get_cross_power_kernel()(src_freq, target_freq, 100 * eps,
+                              normalization == "phase", image_product)
+    if half_spectrum:
+        cross_correlation = fft.irfftn(image_product, s=shape, axes=axes)
+    else:
+        cross_correlation = fft.ifftn(image_product, axes=axes)
+
+    # whole-pixel maxima of all images
+    n_images = moving_images.shape[0]
+    flat_maxima = _get_argmax_abs_kernel()(
+        cross_correlation.reshape(n_images, -1), axis=1
+    )
+    shifts = _wrap_shift(_unravel_index(flat_maxima, shape), shape)
+    shifts = shifts.astype(cp.float64)
+
+    if upsample_factor != 1:
+        if half_spectrum:
+            image_product = _full_spectrum(image_product, shape)
+        for i in range(n_images):
+            shifts[i], _ = _refine_shift(image_product[i], shifts[i],
+                                         upsample_factor)
+
+    # single device -> host transfer of all shifts
+    shifts = shifts.get()
+    # If its only one row or column the shift along that dimension has no
+    # effect. We set to zero.
+    shifts[:, np.asarray(shape) == 1] = 0
+    return shifts
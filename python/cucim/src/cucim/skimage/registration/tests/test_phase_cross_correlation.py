@@ -1,9 +1,10 @@
 import itertools
+import sys
 
 import cupy as cp
 import numpy as np
 import pytest
-from cupy.testing import assert_allclose
+from cupy.testing import assert_allclose, assert_array_equal
 from cupyx.scipy.ndimage import fourier_shift
 from skimage.data import camera, eagle
 
@@ -12,7 +13,8 @@ from cucim.skimage._shared._warnings import expected_warnings
 from cucim.skimage._shared.fft import fftmodule as fft
 from cucim.skimage.data import binary_blobs
 from cucim.skimage.registration._phase_cross_correlation import (
-    _upsampled_dft, phase_cross_correlation)
+    _argmax_abs, _cached_fft_plan, _get_argmax_abs_kernel, _upsampled_dft,
+    phase_cross_correlation, phase_cross_correlation_batch)
 
 
 @pytest.mark.parametrize('normalization', [None, 'phase'])
@@ -74,6 +76,147 @@ def test_real_input(dtype):
     assert_allclose(result[:2], -cp.array(subpixel_shift), atol=0.05)
 
 
+@pytest.mark.parametrize('complex_input', [False, True])
+def test_fft_plan_reuse(complex_input):
+    rng = cp.random.default_rng(5)
+    reference_image = rng.random((48, 40))
+    moving_image = cp.roll(reference_image, (3, -2), axis=(0, 1))
+    if complex_input:
+        reference_image = reference_image.astype(cp.complex128)
+        moving_image = moving_image.astype(cp.complex128)
+
+    shift = phase_cross_correlation(reference_image, moving_image)[0]
+    misses = _cached_fft_plan.cache_info().misses
+    # same-shaped registrations reuse the plans created by the first call
+    for _ in range(3):
+        result = phase_cross_correlation(reference_image, moving_image)
+        assert result[0] == shift
+    assert _cached_fft_plan.cache_info().misses == misses
+
+
+@pytest.mark.parametrize('shape', [(64, 64), (63, 65), (15, 16, 17)])
+@pytest.mark.parametrize('upsample_factor', [1, 10])
+def test_real_input_matches_complex_input(shape, upsample_factor):
+    # real inputs only use the non-redundant half of the spectrum
+    rng = cp.random.default_rng(5)
+    reference_image = rng.standard_normal(shape)
+    shift = (2.4, -1.7, 0.5)[:len(shape)]
+    moving_image = fft.ifftn(
+        fourier_shift(fft.fftn(reference_image), shift)
+    ).real
+
+    expected = phase_cross_correlation(
+        reference_image.astype(complex), moving_image.astype(complex),
+        upsample_factor=upsample_factor
+    )
+    result = phase_cross_correlation(
+        reference_image, moving_image, upsample_factor=upsample_factor
+    )
+    assert_allclose(result[0], expected[0])
+    assert_allclose(result[1], expected[1], atol=1e-6)
+    assert_allclose(result[2], expected[2], atol=1e-6)
+
+
+@pytest.mark.parametrize('space', ['real', 'fourier'])
+def test_reduced_precision(space):
+    reference_image = cp.array(camera()).astype(cp.float64)
+    subpixel_shift = (-2.4, 1.32)
+    shifted_image = fourier_shift(fft.fftn(reference_image), subpixel_shift)
+    if space == 'real':
+        shifted_image = fft.ifftn(shifted_image).real
+    else:
+        reference_image = fft.fftn(reference_image)
+
+    expected = phase_cross_correlation(
+        reference_image, shifted_image, upsample_factor=100, space=space
+    )
+    result = phase_cross_correlation(
+        reference_image, shifted_image, upsample_factor=100, space=space,
+        dtype=cp.float32
+    )
+    assert_allclose(result[0], -cp.array(subpixel_shift), atol=0.05)
+    assert_allclose(result[0], expected[0], atol=0.011)
+    assert_allclose(result[1], expected[1], atol=1e-3)
+
+    with pytest.raises(ValueError):
+        phase_cross_correlation(reference_image, shifted_image, space=space,
+                                dtype=cp.int32)
+
+
+@pytest.mark.parametrize('upsample_factor', [1, 20])
+@pytest.mark.parametrize('complex_input', [False, True])
+def test_batch(upsample_factor, complex_input):
+    reference_image = cp.array(camera()[:128, :127]).astype(cp.float64)
+    shifts = [(-2.4, 1.3), (5, -7), (0.5, 12.25)]
+    moving_images = cp.stack([
+        fft.ifftn(fourier_shift(fft.fftn(reference_image), shift)).real
+        for shift in shifts
+    ])
+    if complex_input:
+        reference_image = reference_image.astype(complex)
+        moving_images = moving_images.astype(complex)
+
+    result = phase_cross_correlation_batch(
+        reference_image, moving_images, upsample_factor=upsample_factor
+    )
+    assert result.shape == (len(shifts), 2)
+    for moving_image, shift in zip(moving_images, result):
+        expected, _, _ = phase_cross_correlation(
+            reference_image, moving_image, upsample_factor=upsample_factor
+        )
+        np.testing.assert_allclose(shift, expected)
+
+    with pytest.raises(ValueError):
+        phase_cross_correlation_batch(reference_image, moving_images[:, 1:])
+
+
+@pytest.mark.parametrize('upsample_factor', [1, 20])
+def test_numpy_input(upsample_factor):
+    reference_image = cp.array(camera()[:64, :64]).astype(cp.float64)
+    shifted_image = fft.ifftn(
+        fourier_shift(fft.fftn(reference_image), (-2.4, 1.3))
+    ).real
+
+    expected = phase_cross_correlation(
+        reference_image, shifted_image, upsample_factor=upsample_factor,
+        return_error='always'
+    )
+    result = phase_cross_correlation(
+        cp.asnumpy(reference_image), cp.asnumpy(shifted_image),
+        upsample_factor=upsample_factor, return_error='always'
+    )
+    # registered on the host
+    assert isinstance(result[0], np.ndarray)
+    np.testing.assert_allclose(result[0], expected[0])
+    np.testing.assert_allclose(result[1], float(expected[1]), atol=1e-6)
+
+
+def test_numpy_input_dtype():
+    reference_image = camera()[:64, :64].astype(np.float64)
+    shifted_image = np.roll(reference_image, (3, -2), axis=(0, 1))
+
+    expected = phase_cross_correlation(
+        cp.asarray(reference_image), cp.asarray(shifted_image),
+        upsample_factor=10, return_error='always', dtype=cp.float32
+    )
+    result = phase_cross_correlation(
+        reference_image, shifted_image, upsample_factor=10,
+        return_error='always', dtype=np.float32
+    )
+    np.testing.assert_allclose(result[0], expected[0])
+
+    with pytest.raises(ValueError):
+        phase_cross_correlation(reference_image, shifted_image,
+                                dtype=np.int32)
+
+
+def test_numpy_input_without_skimage(monkeypatch):
+    monkeypatch.setitem(sys.modules, 'skimage.registration', None)
+    image = camera()[:32, :32].astype(np.float64)
+    with pytest.raises(ImportError, match='scikit-image is required'):
+        phase_cross_correlation(image, image, return_error='always')
+
+
 def test_size_one_dimension_input():
     # take a strip of the input image
     reference_image = fft.fftn(cp.array(camera())[:, 15]).reshape((-1, 1))
@@ -161,6 +304,74 @@ def test_4d_input_subpixel():
     assert_allclose(result, -cp.array(subpixel_shift), atol=0.05)
 
 
+@pytest.mark.parametrize(
+    'dtype', [cp.float32, cp.float64, cp.complex64, cp.complex128]
+)
+def test_argmax_abs(dtype):
+    rng = cp.random.default_rng(0)
+    x = rng.standard_normal((31, 17, 5)).astype(dtype)
+    if x.dtype.kind == 'c':
+        x += 1j * rng.standard_normal(x.shape)
+    expected = np.unravel_index(int(cp.argmax(cp.abs(x))), x.shape)
+    assert tuple(_argmax_abs(x).get().tolist()) == expected
+
+    # ties select the first index, as for argmax
+    x = cp.zeros((8, 8), dtype=dtype)
+    x[5, 2] = -3
+    x[1, 7] = 3
+    x[6, 6] = 3
+    assert tuple(_argmax_abs(x).get().tolist()) == (1, 7)
+
+
+@pytest.mark.parametrize('n_rows', [1, 6])
+@pytest.mark.parametrize('dtype', [cp.float32, cp.complex128])
+def test_argmax_abs_rows(n_rows, dtype):
+    rng = cp.random.default_rng(0)
+    x = rng.standard_normal((n_rows, 40)).astype(dtype)
+    if x.dtype.kind == 'c':
+        x += 1j * rng.standard_normal(x.shape)
+    idx = _get_argmax_abs_kernel()(x, axis=1)
+    assert_array_equal(idx, cp.argmax(cp.abs(x), axis=1))
+
+
+@pytest.mark.parametrize('shape', [(17,), (16, 15), (6, 7, 8)])
+@pytest.mark.parametrize('dtype', [cp.complex64, cp.complex128])
+@pytest.mark.parametrize('offsets_type', [None, int, float, 'device'])
+def test_upsampled_dft_direct(monkeypatch, shape, dtype, offsets_type):
+    rng = cp.random.default_rng(0)
+    data = rng.standard_normal(shape) + 1j * rng.standard_normal(shape)
+    data = data.astype(dtype)
+    if offsets_type is None:
+        offsets = None
+    elif offsets_type == 'device':
+        offsets = cp.arange(3, 3 + len(shape))
+    else:
+        offsets = tuple(offsets_type(o) for o in range(3, 3 + len(shape)))
+
+    # evaluated directly by a single kernel
+    result = _upsampled_dft(data, 9, 4, offsets)
+    assert result.dtype == dtype
+    assert result.shape == (9,) * len(shape)
+
+    # evaluated by matrix products
+    monkeypatch.setattr(
+        'cucim.skimage.registration._phase_cross_correlation.'
+        '_DIRECT_DFT_MAX_WORK', 0
+    )
+    expected = _upsampled_dft(data, 9, 4, offsets)
+    rtol = 1e-4 if dtype == cp.complex64 else 1e-10
+    assert_allclose(result, expected, rtol=rtol, atol=rtol * data.size)
+
+
+@pytest.mark.parametrize('shape', [(16, 15), (64, 64)])
+def test_upsampled_dft_sign(shape):
+    rng = cp.random.default_rng(0)
+    data = rng.standard_normal(shape) + 1j * rng.standard_normal(shape)
+    expected = _upsampled_dft(data.conj(), 30, 20, (3.0, -2.0)).conj()
+    result = _upsampled_dft(data, 30, 20, (3.0, -2.0), sign=1)
+    assert_allclose(result, expected, rtol=1e-10, atol=1e-10 * data.size)
+
+
 def test_mismatch_upsampled_region_size():
     with pytest.raises(ValueError):
         _upsampled_dft(
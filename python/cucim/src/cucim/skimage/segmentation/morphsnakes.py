@@ -1,12 +1,14 @@
 import functools
-from itertools import cycle
 
 import cupy as cp
 import numpy as np
-from cupyx import rsqrt
 
 import cucim.skimage._vendored.ndimage as ndi
 from cucim import _misc
+from cucim.skimage._vendored import _ndimage_filters_core as _filters_core
+from cucim.skimage._vendored import _ndimage_util as _util
+from cucim.skimage._vendored._ndimage_morphology import \
+    _get_binary_erosion_kernel
 
 from .._shared._gradient import gradient
 from .._shared.utils import check_nD, deprecate_kwarg
@@ -23,23 +25,31 @@ class _fcycle:
 
     def __init__(self, iterable):
         """Call functions from the iterable each time it is called."""
-        self.funcs = cycle(iterable)
+        self.funcs = list(iterable)
+        # index of the function used by the next call
+        self.index = 0
 
     def __call__(self, *args, **kwargs):
-        f = next(self.funcs)
+        f = self.funcs[self.index]
+        self.index = (self.index + 1) % len(self.funcs)
         return f(*args, **kwargs)
 
+    def skip(self, n):
+        """Advance the cycle as if it had been called `n` times."""
+        self.index = (self.index + n) % len(self.funcs)
+
 
 # SI and IS operators for 2D and 3D.
-def _get_P2():
-    _P2 = [cp.eye(3),
-           cp.array([[0, 1, 0]] * 3),
-           cp.array(np.flipud(np.eye(3))),
-           cp.array(np.rot90([[0, 1, 0]] * 3))]
-    return _P2
+@functools.lru_cache(maxsize=None)
+def _P2_host():
+    return (np.eye(3),
+            np.array([[0, 1, 0]] * 3),
+            np.flipud(np.eye(3)),
+            np.rot90([[0, 1, 0]] * 3))
 
 
-def _get_P3():
+@functools.lru_cache(maxsize=None)
+def _P3_host():
     _P3 = [np.zeros((3, 3, 3)) for i in range(9)]
 
     _P3[0][:, :, 1] = 1
@@ -51,33 +61,393 @@ def _get_P3():
     _P3[6][[0, 1, 2], :, [2, 1, 0]] = 1
     _P3[7][[0, 1, 2], [0, 1, 2], :] = 1
     _P3[8][[0, 1, 2], [2, 1, 0], :] = 1
-    return [cp.array(p) for p in _P3]
+    return tuple(_P3)
 
 
-def sup_inf(u, footprints, workspace=None):
-    """SI operator."""
-    if workspace is None:
-        erosions = cp.empty(((len(footprints),) + u.shape), dtype=u.dtype)
-    else:
-        erosions = workspace
-    for i, footprint in enumerate(footprints):
-        erosions[i, ...] = ndi.binary_erosion(u, footprint)
-    return erosions.max(0)
+@functools.lru_cache(maxsize=8)
+def _footprints_device(ndim, device_id):
+    # constant footprints, copied to each device only once
+    footprints = _P2_host() if ndim == 2 else _P3_host()
+    return tuple(cp.array(p) for p in footprints)
+
+
+def _get_P2():
+    return list(_footprints_device(2, cp.cuda.Device().id))
+
+
+def _get_P3():
+    return list(_footprints_device(3, cp.cuda.Device().id))
 
 
-def inf_sup(u, footprints, workspace=None):
-    """IS operator."""
-    if workspace is None:
-        dilations = cp.empty(((len(footprints),) + u.shape), dtype=u.dtype)
+def _footprint_offsets(footprint):
+    """Offsets of the nonzero elements of a 3**ndim footprint from its
+    center."""
+    return [tuple(int(o) - 1 for o in idx)
+            for idx in zip(*np.nonzero(footprint))]
+
+
+def _sup_inf_expression(footprints, dilate, neighbor):
+    """C expression of the SI operator (or IS operator if `dilate`).
+
+    ``neighbor(offset)`` gives the (boolean) expression for the element at
+    `offset` from the current one.
+    """
+    inner, outer = ('||', '&&') if dilate else ('&&', '||')
+    terms = []
+    for f in footprints:
+        terms.append(
+            '(' + f' {inner} '.join(map(neighbor, _footprint_offsets(f))) + ')'
+        )
+    return f' {outer} '.join(terms)
+
+
+@cp.memoize(for_each_device=True)
+def _get_sup_inf_kernel(ndim, dilate):
+    """Fused SI operator (or IS operator if `dilate`) for the footprints of
+    `_get_P2` (``ndim == 2``) or `_get_P3` (``ndim == 3``).
+
+    For each element, the erosions (dilations) by all footprints are evaluated
+    from a single read of the 3**ndim neighborhood and their maximum
+    (minimum) is written to the output, so no per-footprint intermediate
+    arrays are needed. Elements outside of ``u`` are treated as 0, as for
+    ``ndi.binary_erosion`` and ``ndi.binary_dilation`` with
+    ``border_value=0``. ``u`` must be C-contiguous.
+    """
+    footprints = _P2_host() if ndim == 2 else _P3_host()
+    offsets = sorted({o for f in footprints for o in _footprint_offsets(f)})
+
+    # strides (in elements) of the C-contiguous input
+    code = [f'ptrdiff_t s_{ndim - 1} = 1;']
+    for k in range(ndim - 2, -1, -1):
+        code.append(f'ptrdiff_t s_{k} = s_{k + 1} * u.shape()[{k + 1}];')
+    for k in range(ndim):
+        code.append(f'ptrdiff_t i_{k} = _ind.get()[{k}];')
+    center = ' + '.join(f'i_{k} * s_{k}' for k in range(ndim))
+    code.append(f'ptrdiff_t c = {center};')
+
+    # Read each neighbor (outside of the array is 0) once. This also covers
+    # what decomposing the P3 planes into pairs of 1D lines would achieve:
+    # every footprint is evaluated from registers, so separate 1D min/max
+    # passes would only add image-sized intermediates and global memory
+    # traffic.
+    def name(offset):
+        return 'v_' + ''.join(str(o + 1) for o in offset)
+
+    for offset in offsets:
+        conds = []
+        for k, o in enumerate(offset):
+            if o < 0:
+                conds.append(f'i_{k} > 0')
+            elif o > 0:
+                conds.append(f'i_{k} < u.shape()[{k}] - 1')
+        index = ' + '.join(
+            [f'({o}) * s_{k}' for k, o in enumerate(offset) if o != 0]
+        )
+        index = 'c + ' + index if index else 'c'
+        conds.append(f'u[{index}] != 0')
+        code.append(f'bool {name(offset)} = ' + ' && '.join(conds) + ';')
+
+    code.append(
+        'out = ' + _sup_inf_expression(footprints, dilate, name) + ';'
+    )
+    return cp.ElementwiseKernel(
+        in_params='raw U u',
+        out_params='U out',
+        operation='\n'.join(code),
+        name=f'cucim_morphsnakes_{"inf_sup" if dilate else "sup_inf"}_{ndim}d',
+    )
+
+
+def _sup_inf_fused(u, out=None):
+    """SI operator for the default footprints in a single kernel."""
+    if out is None:
+        out = cp.empty_like(u)
+    return _get_sup_inf_kernel(u.ndim, False)(u, out)
+
+
+def _inf_sup_fused(u, out=None):
+    """IS operator for the default footprints in a single kernel."""
+    if out is None:
+        out = cp.empty_like(u)
+    return _get_sup_inf_kernel(u.ndim, True)(u, out)
+
+
+# Maximum number of smoothing steps applied by a single 2D kernel
+_MAX_FUSED_SMOOTHING = 4
+
+# Note: the level set is deliberately kept as one int8 per element rather
+# than bit-packed. The image attachment and the region means need per-element
+# values on every iteration, so a packed level set would have to be unpacked
+# and repacked each time. That costs more global memory traffic than the
+# smoothing saves, since the smoothing kernel below already reads and writes
+# the level set only once per iteration.
+
+# Each block computes a _smoothing_tile x _smoothing_tile tile of the output
+_smoothing_tile = 32
+_smoothing_block = (32, 8)
+
+_smoothing_source = """
+extern "C" __global__ void {name}(
+        const signed char* u, signed char* out, const int h, const int w)
+{{
+    // tile of the output plus a halo of one element per operator
+    const int T = {tile} + 2 * {halo};
+    __shared__ signed char buf0[T * T];
+    __shared__ signed char buf1[T * T];
+
+    const int y0 = (int)blockIdx.y * {tile} - {halo};
+    const int x0 = (int)blockIdx.x * {tile} - {halo};
+    const int tid = threadIdx.y * blockDim.x + threadIdx.x;
+    const int n_threads = blockDim.x * blockDim.y;
+
+    // elements outside of the image are 0
+    for (int i = tid; i < T * T; i += n_threads) {{
+        int y = y0 + i / T;
+        int x = x0 + i % T;
+        bool inside = y >= 0 && y < h && x >= 0 && x < w;
+        buf0[i] = inside && u[(long long)y * w + x] != 0;
+    }}
+    __syncthreads();
+{steps}
+    for (int ty = threadIdx.y; ty < {tile}; ty += blockDim.y) {{
+        int y = y0 + {halo} + ty;
+        int x = x0 + {halo} + threadIdx.x;
+        if (y < h && x < w) {{
+            int i = (ty + {halo}) * T + threadIdx.x + {halo};
+            out[(long long)y * w + x] = {result}[i];
+        }}
+    }}
+}}
+"""
+
+# One operator: after step k, the tile is valid up to k elements from its
+# edges.
+_smoothing_step_source = """
+    for (int i = tid; i < T * T; i += n_threads) {{
+        int ty = i / T;
+        int tx = i % T;
+        if (ty < {k} || ty >= T - {k} || tx < {k} || tx >= T - {k}) {{
+            continue;
+        }}
+        int y = y0 + ty;
+        int x = x0 + tx;
+        const signed char* p = {src} + i;
+        {dst}[i] = y >= 0 && y < h && x >= 0 && x < w && ({expr});
+    }}
+    __syncthreads();
+"""
+
+
+@cp.memoize(for_each_device=True)
+def _get_smoothing_kernel(ops):
+    """Apply a sequence of 2D SI/IS operators in a single kernel.
+
+    ``ops`` is a string of ``'S'`` (SI operator) and ``'I'`` (IS operator)
+    characters, applied from left to right. Each block loads its output tile
+    plus a halo of ``len(ops)`` elements into shared memory and applies all
+    operators there, so intermediate results never go through global memory.
+    Launch with blocks of ``_smoothing_block`` threads, each computing a
+    ``_smoothing_tile`` x ``_smoothing_tile`` tile of the output.
+    """
+    footprints = _P2_host()
+    tile = _smoothing_tile
+
+    def neighbor(offset):
+        dy, dx = offset
+        return f'p[{dy} * T + {dx}]'
+
+    steps = []
+    buffers = ('buf0', 'buf1')
+    for k, op in enumerate(ops, start=1):
+        expr = _sup_inf_expression(footprints, op == 'I', neighbor)
+        steps.append(_smoothing_step_source.format(
+            k=k, src=buffers[(k - 1) % 2], dst=buffers[k % 2], expr=expr
+        ))
+    name = f'cucim_morphsnakes_smoothing_{ops}'
+    source = _smoothing_source.format(
+        name=name, tile=tile, halo=len(ops), steps=''.join(steps),
+        result=buffers[len(ops) % 2],
+    )
+    return cp.RawKernel(source, name)
+
+
+def _smooth(u, smoothing, workspace, u_alt):
+    """Apply the curvature operator `smoothing` times.
+
+    `workspace` and `u_alt` are buffers of the same shape and dtype as `u`.
+    Returns the result and the buffer that is free for reuse.
+    """
+    if u.ndim == 2 and 0 < smoothing <= _MAX_FUSED_SMOOTHING:
+        # same sequence of SIoIS / ISoSI as repeated calls to _curvop
+        phase = _curvop.index
+        ops = ''.join(('IS', 'SI')[(phase + i) % 2] for i in range(smoothing))
+        _curvop.index = (phase + smoothing) % 2
+
+        h, w = u.shape
+        grid = (-(-w // _smoothing_tile), -(-h // _smoothing_tile))
+        kernel = _get_smoothing_kernel(ops)
+        kernel(grid, _smoothing_block, (u, u_alt, np.int32(h), np.int32(w)))
+        return u_alt, u
+    for _ in range(smoothing):
+        u, u_alt = _curvop(u, workspace, u_alt), u
+    return u, u_alt
+
+
+def _binary_erosion_once(u, footprint, out, invert=False, mask=None,
+                         accumulate=False):
+    """Binary erosion (or dilation if `invert`) of `u`, written to `out`.
+
+    Equivalent to ``ndi.binary_erosion(u, footprint, output=out)`` (or
+    ``ndi.binary_dilation``) for the footprints used here, which are point
+    symmetric and contain their center. The kernel is launched directly, which
+    avoids the device synchronizations ``ndi.binary_erosion`` needs to inspect
+    the footprint on every call. If `footprint` is a tuple, it is the shape of
+    a footprint that is nonzero everywhere, for which the kernel does not read
+    any weights. If a (C-contiguous) `mask` is given, `out` is only eroded
+    where `mask` is nonzero and equal to `u` elsewhere. If `accumulate`, the
+    result is combined into `out` as ``max(out, erosion)`` (or
+    ``min(out, dilation)``).
+    """
+    if isinstance(footprint, tuple):
+        shape, all_weights_nonzero = footprint, True
+        args = (u,)
+    else:
+        shape, all_weights_nonzero = footprint.shape, False
+        args = (u, footprint)
+    masked = mask is not None
+    if masked:
+        args += (mask,)
+    offsets = _filters_core._origins_to_offsets((0,) * u.ndim, shape)
+    # (w_shape, int_type, offsets, center_is_true, border_value, invert,
+    #  masked, all_weights_nonzero)
+    kernel = _get_binary_erosion_kernel(
+        shape, _util._get_inttype(u), offsets, True, 0, invert, masked,
+        all_weights_nonzero, accumulate
+    )
+    return kernel(*args, out)
+
+
+def sup_inf(u, footprints, workspace=None, out=None):
+    """SI operator.
+
+    The erosions are combined into `out` as they are computed, so no
+    per-footprint storage is needed (`workspace` is ignored).
+    """
+    if out is None:
+        out = cp.zeros_like(u)
     else:
-        dilations = workspace
-    for i, footprint in enumerate(footprints):
-        dilations[i, ...] = ndi.binary_dilation(u, footprint)
-    return dilations.min(0)
+        out.fill(0)
+    for footprint in footprints:
+        _binary_erosion_once(u, footprint, out, accumulate=True)
+    return out
 
 
-_curvop = _fcycle([lambda u, f, w: sup_inf(inf_sup(u, f, w), f, w),   # SIoIS
-                   lambda u, f, w: inf_sup(sup_inf(u, f, w), f, w)])  # ISoSI
+def inf_sup(u, footprints, workspace=None, out=None):
+    """IS operator.
+
+    The dilations are combined into `out` as they are computed, so no
+    per-footprint storage is needed (`workspace` is ignored).
+    """
+    if out is None:
+        out = cp.ones_like(u)
+    else:
+        out.fill(1)
+    for footprint in footprints:
+        _binary_erosion_once(u, footprint, out, invert=True, accumulate=True)
+    return out
+
+
+# `w` is a buffer of the same shape and dtype as `u` for the intermediate
+# result and `out` (if not None) receives the result
+_curvop = _fcycle([
+    lambda u, w, out=None: _sup_inf_fused(_inf_sup_fused(u, w), out),  # SIoIS
+    lambda u, w, out=None: _inf_sup_fused(_sup_inf_fused(u, w), out),  # ISoSI
+])
+
+
+def _no_callback(x):
+    """Default `iter_callback` (never actually called)."""
+
+
+class _IterCallback:
+
+    def __init__(self, iter_callback):
+        """Call `iter_callback` with a snapshot of the level set.
+
+        The snapshot is taken in stream order, after which the main stream
+        can proceed: the device work of the callback itself is issued on a
+        separate stream. The default callback is skipped entirely.
+        """
+        self.iter_callback = iter_callback
+        self.enabled = iter_callback is not _no_callback
+        if self.enabled:
+            self.stream = cp.cuda.Stream(non_blocking=True)
+
+    def __call__(self, u):
+        if not self.enabled:
+            return
+        main_stream = cp.cuda.get_current_stream()
+        self.stream.wait_event(main_stream.record())
+        with self.stream:
+            snapshot = u.copy()
+            # u may only be overwritten once the copy is done
+            main_stream.wait_event(self.stream.record())
+            self.iter_callback(snapshot)
+
+    def join(self):
+        """Make the current stream wait for all device work of the
+        callbacks (e.g. before returning their results to the user)."""
+        if self.enabled:
+            cp.cuda.get_current_stream().wait_event(self.stream.record())
+
+
+@cp.memoize(for_each_device=True)
+def _get_changed_kernel():
+    return cp.ReductionKernel(
+        in_params='T a, T b, T c',
+        out_params='bool changed',
+        map_expr='(a != b) || (b != c)',
+        reduce_expr='a || b',
+        post_map_expr='changed = a',
+        identity='false',
+        name='cucim_morphsnakes_changed',
+    )
+
+
+class _ConvergenceCheck:
+
+    def __init__(self, u, tol_iters):
+        """Detect convergence of the level set every `tol_iters` iterations.
+
+        The smoothing operator alternates between SIoIS and ISoSI, so an
+        iteration can map the level set differently from the previous one. It
+        is only a fixed point of the evolution once it is unchanged by two
+        consecutive iterations. The level sets of the two iterations
+        preceding each check are kept, so that a single reduction and device
+        synchronization per `tol_iters` iterations suffices.
+        """
+        if tol_iters < 2:
+            raise ValueError("tol_iters must be at least 2")
+        self.tol_iters = tol_iters
+        self.prev2 = cp.empty_like(u)
+        self.prev1 = cp.empty_like(u)
+        self._store(0, u)
+
+    def _store(self, i, u):
+        if (i + 2) % self.tol_iters == 0:
+            cp.copyto(self.prev2, u)
+        if (i + 1) % self.tol_iters == 0:
+            cp.copyto(self.prev1, u)
+
+    def __call__(self, i, u):
+        """Return whether `u`, the level set after iteration `i`, has
+        converged."""
+        if i % self.tol_iters == 0:
+            changed = _get_changed_kernel()(self.prev2, self.prev1, u)
+            if not changed:  # synchronize!
+                return True
+        self._store(i, u)
+        return False
 
 
 def _check_input(image, init_level_set):
@@ -107,6 +477,42 @@ def _init_level_set(init_level_set, image_shape):
     return res
 
 
+def _prepare_level_set(image, init_level_set):
+    """Validate the inputs and set up the level set and its buffers.
+
+    Returns the (C-contiguous, as assumed by the kernels) int8 level set and
+    two buffers of the same shape and dtype: a workspace and the buffer the
+    smoothing steps alternate with.
+    """
+    init_level_set = _init_level_set(init_level_set, image.shape)
+
+    _check_input(image, init_level_set)
+
+    u = (init_level_set > 0).astype(cp.int8, order='C')
+
+    if _misc.ndim(u) not in (2, 3):
+        raise ValueError("u has an invalid number of dimensions "
+                         "(should be 2 or 3)")
+    return u, cp.empty_like(u), cp.empty_like(u)
+
+
+@cp.memoize(for_each_device=True)
+def _get_disk_level_set_kernel(ndim):
+    # evaluates the disk directly from the output coordinates (no grid)
+    in_params = ', '.join(f'float64 c{k}' for k in range(ndim))
+    code = ['double d = 0.0, t;']
+    for k in range(ndim):
+        code.append(f't = _ind.get()[{k}] - c{k};')
+        code.append('d += t * t;')
+    code.append('out = radius - sqrt(d) > 0;')
+    return cp.ElementwiseKernel(
+        in_params=in_params + ', float64 radius',
+        out_params='int8 out',
+        operation='\n'.join(code),
+        name=f'cucim_morphsnakes_disk_level_set_{ndim}d',
+    )
+
+
 def disk_level_set(image_shape, *, center=None, radius=None):
     """Create a disk level set with binary values.
 
@@ -137,12 +543,24 @@ def disk_level_set(image_shape, *, center=None, radius=None):
     if radius is None:
         radius = min(image_shape) * 3.0 / 8.0
 
-    grid = cp.mgrid[[slice(i) for i in image_shape]]
-    grid = (grid.T - cp.asarray(center)).T
-    grid *= grid
-    phi = radius - cp.sqrt(cp.sum(grid, axis=0))
-    res = (phi > 0).astype(cp.int8)
-    return res
+    res = cp.empty(image_shape, dtype=cp.int8)
+    kernel = _get_disk_level_set_kernel(len(image_shape))
+    return kernel(*center, radius, res)
+
+
+@cp.memoize(for_each_device=True)
+def _get_checkerboard_level_set_kernel(ndim):
+    # XOR of the parities of the square indices along each axis, evaluated
+    # directly from the output coordinates (no grid)
+    parity = ' ^ '.join(
+        f'(_ind.get()[{k}] / square_size)' for k in range(ndim)
+    )
+    return cp.ElementwiseKernel(
+        in_params='int64 square_size',
+        out_params='int8 out',
+        operation=f'out = ({parity}) & 1;',
+        name=f'cucim_morphsnakes_checkerboard_level_set_{ndim}d',
+    )
 
 
 def checkerboard_level_set(image_shape, square_size=5):
@@ -165,22 +583,26 @@ def checkerboard_level_set(image_shape, square_size=5):
     disk_level_set
     """
 
-    grid = cp.mgrid[[slice(i) for i in image_shape]]
-    grid = grid // square_size
-
-    # Alternate 0/1 for even/odd numbers.
-    grid = grid & 1
-
-    # CuPy Backend: use functools.reduce instead of cp.bitwise_xor.reduce
-    #     checkerboard = cp.bitwise_xor.reduce(grid, axis=0)
-    checkerboard = functools.reduce(cp.bitwise_xor, [g for g in grid])
-    res = checkerboard.astype(cp.int8)
-    return res
+    res = cp.empty(image_shape, dtype=cp.int8)
+    kernel = _get_checkerboard_level_set_kernel(len(image_shape))
+    return kernel(square_size, res)
 
 
-@cp.fuse()
-def _fused_inverse_kernel(gradnorm, alpha):
-    return rsqrt(1.0 + alpha * gradnorm)
+@cp.memoize(for_each_device=True)
+def _get_inverse_gradient_kernel(ndim, compute_type):
+    # 1 / sqrt(1 + alpha * |g|) from the per-axis derivatives g0, g1, ...
+    in_params = ', '.join([f'T g{k}' for k in range(ndim)]
+                          + ['float64 alpha'])
+    norm2 = ' + '.join(f'(C)g{k} * (C)g{k}' for k in range(ndim))
+    return cp.ElementwiseKernel(
+        in_params=in_params,
+        out_params='F out',
+        operation=f"""
+        typedef {compute_type} C;
+        out = rsqrt((C)1 + (C)alpha * sqrt({norm2}));
+        """,
+        name=f'cucim_morphsnakes_inverse_gradient_{ndim}d_{compute_type}',
+    )
 
 
 def inverse_gaussian_gradient(image, alpha=100.0, sigma=5.0):
@@ -211,31 +633,138 @@ def inverse_gaussian_gradient(image, alpha=100.0, sigma=5.0):
         Preprocessed image (or volume) suitable for
         `morphological_geodesic_active_contour`.
     """
-    gradnorm = ndi.gaussian_gradient_magnitude(image, sigma, mode='nearest')
-    return _fused_inverse_kernel(gradnorm, alpha)
-
-
-@cp.fuse()
-def _abs_grad_kernel(gx, gy):
-    return cp.abs(gx) + cp.abs(gy)
-
-
-@cp.fuse()
-def _fused_variance_kernel(
-    image, c1, c2, lam1, lam2, abs_du,
-):
-    difference_term = image - c1
-    difference_term *= difference_term
-    difference_term *= lam1
-    term2 = image - c2
-    term2 *= term2
-    term2 *= lam2
-    difference_term -= term2
-
-    aux = abs_du * difference_term
-    aux_lt0 = aux < 0
-    aux_gt0 = aux > 0
-    return aux_lt0, aux_gt0
+    # Gaussian derivatives along each axis, as in
+    # ndi.gaussian_gradient_magnitude, with the magnitude and the inversion
+    # fused into a single kernel
+    derivatives = []
+    for axis in range(image.ndim):
+        order = [0] * image.ndim
+        order[axis] = 1
+        derivatives.append(
+            ndi.gaussian_filter(image, sigma, order, mode='nearest')
+        )
+    if derivatives[0].dtype.kind == 'f':
+        # overwrite the first derivative with the result
+        out = derivatives[0]
+    else:
+        out = cp.empty(image.shape, dtype=cp.float64)
+    compute_type = 'double' if out.dtype == cp.float64 else 'float'
+    kernel = _get_inverse_gradient_kernel(image.ndim, compute_type)
+    return kernel(*derivatives, alpha, out)
+
+
+@cp.memoize(for_each_device=True)
+def _get_region_means_kernel():
+    # Mean image value outside (c0) and inside (c1) the level set, from the
+    # sums of image * u, u and image accumulated in a single pass. As a
+    # ReductionKernel has a single output, the means are packed as
+    # complex(c0, c1).
+    return cp.ReductionKernel(
+        in_params='T image, U u',
+        out_params='complex128 means',
+        map_expr='_cucim_region_sums_t(image, u)',
+        reduce_expr='a + b',
+        post_map_expr="""
+        double n = _in_ind.size() / _out_ind.size();
+        double c0 = (a.si - a.siu) / (n - a.su + 1e-8);
+        double c1 = a.siu / (a.su + 1e-8);
+        means = complex<double>(c0, c1);
+        """,
+        identity='_cucim_region_sums_t()',
+        reduce_type='_cucim_region_sums_t',
+        name='cucim_morphsnakes_region_means',
+        preamble="""
+        struct _cucim_region_sums_t {
+            double siu, su, si;
+            __device__ _cucim_region_sums_t() : siu(0), su(0), si(0) {}
+            __device__ _cucim_region_sums_t(double image, double u) :
+                siu(image * u), su(u), si(image) {}
+        };
+
+        __device__ _cucim_region_sums_t operator+(
+            const _cucim_region_sums_t& a, const _cucim_region_sums_t& b)
+        {
+            _cucim_region_sums_t c;
+            c.siu = a.siu + b.siu;
+            c.su = a.su + b.su;
+            c.si = a.si + b.si;
+            return c;
+        }
+        """,
+    )
+
+
+@cp.memoize(for_each_device=True)
+def _get_acwe_attachment_kernel(ndim):
+    """Fused MorphACWE image attachment step.
+
+    Writes ``1`` where ``aux < 0``, ``0`` where ``aux > 0`` and ``u``
+    elsewhere, with ``aux = |gradient(u)| * difference_term``. Only the sign
+    of ``aux`` matters, so instead of the gradient magnitude, the kernel
+    checks whether any component of the gradient of ``u`` (evaluated with
+    the same finite differences as `gradient`) is nonzero. ``u`` must be
+    C-contiguous and have at least 2 elements along each axis.
+    """
+    code = [f'ptrdiff_t s_{ndim - 1} = 1;']
+    for k in range(ndim - 2, -1, -1):
+        code.append(f'ptrdiff_t s_{k} = s_{k + 1} * u.shape()[{k + 1}];')
+    center = ' + '.join(f'_ind.get()[{k}] * s_{k}' for k in range(ndim))
+    code.append(f'ptrdiff_t c = {center};')
+    code.append('bool has_gradient = false;')
+    for k in range(ndim):
+        code.append(f"""
+        {{
+            ptrdiff_t i = _ind.get()[{k}];
+            ptrdiff_t lo = i == 0 ? c : c - s_{k};
+            ptrdiff_t hi = i == u.shape()[{k}] - 1 ? c : c + s_{k};
+            has_gradient |= u[hi] != u[lo];
+        }}""")
+    code.append("""
+        double value = image;
+        double difference_term = value - c1;
+        difference_term *= difference_term;
+        difference_term *= lam1;
+        double term2 = value - c2;
+        term2 *= term2;
+        term2 *= lam2;
+        difference_term -= term2;
+
+        if (has_gradient && difference_term < 0) {
+            out = 1;
+        } else if (has_gradient && difference_term > 0) {
+            out = 0;
+        } else {
+            out = u[c];
+        }
+        """)
+    return cp.ElementwiseKernel(
+        in_params=('raw U u, T image, float64 c1, float64 c2, float64 lam1, '
+                   'float64 lam2'),
+        out_params='U out',
+        operation='\n'.join(code),
+        name=f'cucim_morphsnakes_acwe_attachment_{ndim}d',
+    )
+
+
+def _compact_image(image):
+    """Return `image` as float16 if that represents all of its values exactly.
+
+    MorphACWE reads the whole image twice per iteration (for the region means
+    and the image attachment), so a narrower dtype directly reduces the
+    memory traffic. This is only done for integer images of more than 2 bytes
+    per element (narrower ones would not shrink) whose values lie within
+    [-2048, 2048], which float16 represents exactly, so the result is
+    unchanged.
+    """
+    if image.dtype.kind not in 'iu' or image.dtype.itemsize <= 2:
+        return image
+    if image.size == 0:
+        return image
+    # (a single device -> host transfer, once per call)
+    lo, hi = cp.stack([image.min(), image.max()]).tolist()
+    if lo < -2048 or hi > 2048:
+        return image
+    return image.astype(cp.float16)
 
 
 @deprecate_kwarg({'iterations': 'num_iter'},
@@ -243,7 +772,8 @@ def _fused_variance_kernel(
                  deprecated_version="22.02.00")
 def morphological_chan_vese(image, num_iter, init_level_set='checkerboard',
                             smoothing=1, lambda1=1, lambda2=1,
-                            iter_callback=lambda x: None):
+                            iter_callback=_no_callback, early_stop=False,
+                            tol_iters=8):
     """Morphological Active Contours without Edges (MorphACWE)
 
     Active contours without edges implemented with morphological operators. It
@@ -280,7 +810,18 @@ def morphological_chan_vese(image, num_iter, init_level_set='checkerboard',
     iter_callback : function, optional
         If given, this function is called once per iteration with the current
         level set as the only argument. This is useful for debugging or for
-        plotting intermediate results during the evolution.
+        plotting intermediate results during the evolution. The argument is
+        a snapshot (copy) of the level set, and any device work done by the
+        callback is issued on a separate stream, so that it can overlap with
+        the following iterations.
+    early_stop : bool, optional
+        If True, stop before `num_iter` iterations once the level set has
+        converged, i.e. did not change during two consecutive iterations.
+        The result is the same as without early stopping, and so are the
+        results of subsequent calls.
+    tol_iters : int, optional
+        With `early_stop`, convergence is checked (which requires a device
+        synchronization) every `tol_iters` iterations. Must be at least 2.
 
     Returns
     -------
@@ -312,56 +853,90 @@ def morphological_chan_vese(image, num_iter, init_level_set='checkerboard',
            2014, :DOI:`10.1109/TPAMI.2013.106`
     """
 
-    init_level_set = _init_level_set(init_level_set, image.shape)
-
-    _check_input(image, init_level_set)
-
-    u = (init_level_set > 0).astype(cp.int8)
-
-    if _misc.ndim(u) == 2:
-        footprints = _get_P2()
-    elif _misc.ndim(u) == 3:
-        footprints = _get_P3()
-    else:
-        raise ValueError("u has an invalid number of dimensions "
-                         "(should be 2 or 3)")
-    workspace = cp.empty(((len(footprints),) + u.shape), dtype=u.dtype)
+    u, workspace, u_alt = _prepare_level_set(image, init_level_set)
+    if num_iter > 0 and min(u.shape) < 2:
+        raise ValueError(
+            "Shape of array too small to calculate a numerical gradient, "
+            "at least 2 elements are required."
+        )
+    image = _compact_image(image)
+    region_means = _get_region_means_kernel()
+    image_attachment = _get_acwe_attachment_kernel(u.ndim)
 
+    iter_callback = _IterCallback(iter_callback)
     iter_callback(u)
-    for i in range(num_iter):
+    convergence = _ConvergenceCheck(u, tol_iters) if early_stop else None
+    for i in range(1, num_iter + 1):
 
         # inside = u > 0
         # outside = u <= 0
-        c0 = (image * (1 - u)).sum()
-        c0 /= float((1 - u).sum() + 1e-8)
-        c1 = (image * u).sum()
-        c1 /= float(u.sum() + 1e-8)
-
-        # Image attachment
-        du = gradient(u)
-        abs_du = _abs_grad_kernel(du[0], du[1])
-        aux_lt0, aux_gt0 = _fused_variance_kernel(
-            image, c1, c0, lambda1, lambda2, abs_du
-        )
-        u[aux_lt0] = 1
-        u[aux_gt0] = 0
+        # (0-dim views of a device array, so there is no synchronization)
+        means = region_means(image, u)
+        c0, c1 = means.real, means.imag
+
+        # Image attachment (written to the workspace, as the kernel reads
+        # the neighbors of each element of u)
+        image_attachment(u, image, c1, c0, lambda1, lambda2, workspace)
+        u, workspace = workspace, u
 
         # Smoothing
-        for _ in range(smoothing):
-            u = _curvop(u, footprints, workspace)
+        u, u_alt = _smooth(u, smoothing, workspace, u_alt)
 
         iter_callback(u)
+        if convergence is not None and convergence(i, u):
+            # leave the SI/IS phase of the curvature operator (shared by
+            # all calls) as it would be after all `num_iter` iterations
+            _curvop.skip((num_iter - i) * smoothing)
+            break
 
+    iter_callback.join()
     return u
 
 
+@cp.memoize(for_each_device=True)
+def _get_gac_attachment_kernel(ndim):
+    """Fused MorphGAC image attachment step.
+
+    Computes ``aux = sum(dimage[k] * gradient(u)[k])`` with the gradient of
+    ``u`` evaluated in-kernel (central differences in the interior and
+    one-sided differences at the edges, as in `gradient`) and writes ``1``
+    where ``aux > 0``, ``0`` where ``aux < 0`` and ``u`` elsewhere. ``u``
+    must be C-contiguous and have at least 2 elements along each axis.
+    """
+    code = [f'ptrdiff_t s_{ndim - 1} = 1;']
+    for k in range(ndim - 2, -1, -1):
+        code.append(f'ptrdiff_t s_{k} = s_{k + 1} * u.shape()[{k + 1}];')
+    center = ' + '.join(f'_ind.get()[{k}] * s_{k}' for k in range(ndim))
+    code.append(f'ptrdiff_t c = {center};')
+    code.append('F aux = 0, du;')
+    for k in range(ndim):
+        code.append(f"""
+        if (_ind.get()[{k}] == 0) {{
+            du = u[c + s_{k}] - u[c];
+        }} else if (_ind.get()[{k}] == u.shape()[{k}] - 1) {{
+            du = u[c] - u[c - s_{k}];
+        }} else {{
+            du = (F)(u[c + s_{k}] - u[c - s_{k}]) / (F)2;
+        }}
+        aux += dimage{k} * du;""")
+    code.append('out = aux > 0 ? (U)1 : (aux < 0 ? (U)0 : u[c]);')
+    in_params = ', '.join(['raw U u'] + [f'F dimage{k}' for k in range(ndim)])
+    return cp.ElementwiseKernel(
+        in_params=in_params,
+        out_params='U out',
+        operation='\n'.join(code),
+        name=f'cucim_morphsnakes_gac_attachment_{ndim}d',
+    )
+
+
 @deprecate_kwarg({'iterations': 'num_iter'},
                  removed_version="23.02.00",
                  deprecated_version="22.02.00")
 def morphological_geodesic_active_contour(gimage, num_iter,
                                           init_level_set='disk', smoothing=1,
                                           threshold='auto', balloon=0,
-                                          iter_callback=lambda x: None):
+                                          iter_callback=_no_callback,
+                                          early_stop=False, tol_iters=8):
     """Morphological Geodesic Active Contours (MorphGAC).
 
     Geodesic active contours implemented with morphological operators. It can
@@ -407,7 +982,18 @@ def morphological_geodesic_active_contour(gimage, num_iter,
     iter_callback : function, optional
         If given, this function is called once per iteration with the current
         level set as the only argument. This is useful for debugging or for
-        plotting intermediate results during the evolution.
+        plotting intermediate results during the evolution. The argument is
+        a snapshot (copy) of the level set, and any device work done by the
+        callback is issued on a separate stream, so that it can overlap with
+        the following iterations.
+    early_stop : bool, optional
+        If True, stop before `num_iter` iterations once the level set has
+        converged, i.e. did not change during two consecutive iterations.
+        The result is the same as without early stopping, and so are the
+        results of subsequent calls.
+    tol_iters : int, optional
+        With `early_stop`, convergence is checked (which requires a device
+        synchronization) every `tol_iters` iterations. Must be at least 2.
 
     Returns
     -------
@@ -440,54 +1026,48 @@ def morphological_geodesic_active_contour(gimage, num_iter,
     """
 
     image = gimage
-    init_level_set = _init_level_set(init_level_set, image.shape)
-
-    _check_input(image, init_level_set)
+    u, workspace, u_alt = _prepare_level_set(image, init_level_set)
 
     if threshold == 'auto':
         threshold = cp.percentile(image, 40)
 
-    structure = cp.ones((3,) * len(image.shape), dtype=cp.int8)
+    # shape of the (all ones) balloon structuring element
+    structure = (3,) * len(image.shape)
     dimage = gradient(image)
     # threshold_mask = image > threshold
     if balloon != 0:
-        threshold_mask_balloon = image > threshold / cp.abs(balloon)
-
-    u = (init_level_set > 0).astype(cp.int8)
+        threshold_mask_balloon = cp.ascontiguousarray(
+            image > threshold / cp.abs(balloon)
+        )
 
-    if _misc.ndim(u) == 2:
-        footprints = _get_P2()
-    elif _misc.ndim(u) == 3:
-        footprints = _get_P3()
-    else:
-        raise ValueError("u has an invalid number of dimensions "
-                         "(should be 2 or 3)")
-    workspace = cp.empty(((len(footprints),) + u.shape), dtype=u.dtype)
+    image_attachment = _get_gac_attachment_kernel(u.ndim)
 
+    iter_callback = _IterCallback(iter_callback)
     iter_callback(u)
+    convergence = _ConvergenceCheck(u, tol_iters) if early_stop else None
 
-    for _ in range(num_iter):
+    for i in range(1, num_iter + 1):
 
-        # Balloon
-        if balloon > 0:
-            aux = ndi.binary_dilation(u, structure)
-        elif balloon < 0:
-            aux = ndi.binary_erosion(u, structure)
+        # Balloon (only applied where threshold_mask_balloon is True)
         if balloon != 0:
-            u[threshold_mask_balloon] = aux[threshold_mask_balloon]
+            _binary_erosion_once(u, structure, workspace, invert=balloon > 0,
+                                 mask=threshold_mask_balloon)
+            u, workspace = workspace, u
 
-        # Image attachment
-        aux = cp.zeros_like(image)
-        du = gradient(u)
-        for el1, el2 in zip(dimage, du):
-            aux += el1 * el2
-        u[aux > 0] = 1
-        u[aux < 0] = 0
+        # Image attachment (written to the workspace, as the kernel reads
+        # the neighbors of each element of u)
+        image_attachment(u, *dimage, workspace)
+        u, workspace = workspace, u
 
         # Smoothing
-        for _ in range(smoothing):
-            u = _curvop(u, footprints, workspace)
+        u, u_alt = _smooth(u, smoothing, workspace, u_alt)
 
         iter_callback(u)
+        if convergence is not None and convergence(i, u):
+            # leave the SI/IS phase of the curvature operator (shared by
+            # all calls) as it would be after all `num_iter` iterations
+            _curvop.skip((num_iter - i) * smoothing)
+            break
 
+    iter_callback.join()
     return u
@@ -2,11 +2,17 @@ import cupy as cp
 import pytest
 from cupy.testing import assert_array_equal
 
+import cucim.skimage._vendored.ndimage as ndi
 from cucim.skimage._shared.testing import expected_warnings
 from cucim.skimage.segmentation import (disk_level_set,
                                         inverse_gaussian_gradient,
                                         morphological_chan_vese,
                                         morphological_geodesic_active_contour)
+from cucim.skimage.segmentation import morphsnakes
+from cucim.skimage.segmentation.morphsnakes import (_get_P2, _get_P3,
+                                                    _inf_sup_fused, _smooth,
+                                                    _sup_inf_fused, inf_sup,
+                                                    sup_inf)
 
 
 def gaussian_blob():
@@ -142,6 +148,88 @@ def test_init_level_sets():
     assert_array_equal(disk_ls, disk_ref)
 
 
+@pytest.mark.parametrize('dtype', [cp.uint32, cp.int32, cp.int64])
+@pytest.mark.parametrize('high', [1000, 5000])
+def test_morphsnakes_chan_vese_integer_image(dtype, high):
+    rng = cp.random.default_rng(3)
+    image = rng.integers(0, high, (24, 30)).astype(dtype)
+    image[6:18, 8:20] //= 4
+
+    ls = morphological_chan_vese(image, num_iter=5, smoothing=2)
+    expected = morphological_chan_vese(image.astype(cp.float64), num_iter=5,
+                                       smoothing=2)
+    assert_array_equal(ls, expected)
+
+
+@pytest.mark.parametrize('smoothing', [1, 2])
+@pytest.mark.parametrize('tol_iters', [2, 3, 8])
+def test_morphsnakes_early_stop(smoothing, tol_iters):
+    img = gaussian_blob()
+    ls = disk_level_set(img.shape, center=(5, 5), radius=3)
+    gimg = inverse_gaussian_gradient(img, alpha=10.0, sigma=1.0)
+
+    for func, image, kwargs in [
+        (morphological_chan_vese, img, {}),
+        (morphological_geodesic_active_contour, gimg, {'balloon': 1}),
+    ]:
+        # (an odd number of iterations changes the SI/IS phase of the
+        # curvature operator for odd smoothing)
+        morphsnakes._curvop.index = 0
+        expected = func(image, num_iter=99,
+                        init_level_set=ls, smoothing=smoothing, **kwargs)
+        expected_index = morphsnakes._curvop.index
+
+        evolution = []
+        morphsnakes._curvop.index = 0
+        ls_early = func(image, num_iter=99,
+                        init_level_set=ls, smoothing=smoothing,
+                        iter_callback=evolution.append, early_stop=True,
+                        tol_iters=tol_iters, **kwargs)
+        assert_array_equal(ls_early, expected)
+        assert len(evolution) < 100
+        # the phase used by subsequent calls is not affected either
+        assert morphsnakes._curvop.index == expected_index
+
+
+def test_morphsnakes_early_stop_invalid_tol_iters():
+    img = gaussian_blob()
+    with pytest.raises(ValueError):
+        morphological_chan_vese(img, num_iter=5, early_stop=True,
+                                tol_iters=1)
+
+
+@pytest.mark.parametrize('dtype', [cp.float32, cp.float64])
+@pytest.mark.parametrize('ndim', [2, 3])
+def test_inverse_gaussian_gradient(dtype, ndim):
+    rng = cp.random.default_rng(0)
+    image = rng.random((12,) * ndim).astype(dtype)
+    gimage = inverse_gaussian_gradient(image, alpha=10.0, sigma=1.5)
+
+    gradnorm = ndi.gaussian_gradient_magnitude(image, 1.5, mode='nearest')
+    expected = 1.0 / cp.sqrt(1.0 + 10.0 * gradnorm)
+    assert gimage.dtype == dtype
+    rtol = 1e-5 if dtype == cp.float32 else 1e-12
+    cp.testing.assert_allclose(gimage, expected, rtol=rtol)
+
+
+@pytest.mark.parametrize('shape', [(9, 12), (7, 8, 5)])
+@pytest.mark.parametrize('center, radius', [(None, None), (1.5, 3), (3, 2.2)])
+def test_disk_level_set(shape, center, radius):
+    if center is not None:
+        center = (center,) * len(shape)
+    ls = disk_level_set(shape, center=center, radius=radius)
+
+    if center is None:
+        center = tuple(s // 2 for s in shape)
+    if radius is None:
+        radius = min(shape) * 3.0 / 8.0
+    grid = cp.mgrid[[slice(s) for s in shape]]
+    grid = (grid.T - cp.asarray(center)).T
+    expected = (radius - cp.sqrt(cp.sum(grid * grid, axis=0))) > 0
+    assert ls.dtype == cp.int8
+    assert_array_equal(ls, expected.astype(cp.int8))
+
+
 def test_morphsnakes_3d():
     image = cp.zeros((7, 7, 7))
 
@@ -162,3 +250,36 @@ def test_morphsnakes_3d():
     # Check that the contour is shrinking at every iteration
     for v1, v2 in zip(evolution[:-1], evolution[1:]):
         assert v1 >= v2
+
+
+@pytest.mark.parametrize('ndim', [2, 3])
+def test_sup_inf_inf_sup(ndim):
+    rng = cp.random.default_rng(5)
+    u = (rng.random((9,) * ndim) > 0.5).astype(cp.int8)
+    footprints = _get_P2() if ndim == 2 else _get_P3()
+
+    erosions = cp.stack([ndi.binary_erosion(u, f) for f in footprints])
+    assert_array_equal(sup_inf(u, footprints), erosions.max(0))
+    assert_array_equal(_sup_inf_fused(u), erosions.max(0))
+    dilations = cp.stack([ndi.binary_dilation(u, f) for f in footprints])
+    assert_array_equal(inf_sup(u, footprints), dilations.min(0))
+    assert_array_equal(_inf_sup_fused(u), dilations.min(0))
+
+
+@pytest.mark.parametrize('smoothing', [1, 2, 3, 4])
+@pytest.mark.parametrize('phase', [0, 1])
+def test_smooth_fused(monkeypatch, smoothing, phase):
+    rng = cp.random.default_rng(smoothing)
+    u = (rng.random((45, 70)) > 0.5).astype(cp.int8)
+
+    def smooth(u):
+        morphsnakes._curvop.index = phase
+        out, _ = _smooth(u, smoothing, cp.empty_like(u), cp.empty_like(u))
+        return out, morphsnakes._curvop.index
+
+    result, index = smooth(u)
+    # per-step kernels
+    monkeypatch.setattr(morphsnakes, '_MAX_FUSED_SMOOTHING', 0)
+    expected, expected_index = smooth(u)
+    assert_array_equal(result, expected)
+    assert index == expected_index